@@ -3,130 +3,544 @@
 """Burp Suite MCP Server - AI-powered web application security testing interface."""
 import os
 import sys
-import json
+import atexit
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 import asyncio
-import aiofiles
+import base64
+import binascii
+import html
+import io
+import urllib.parse
+import functools
+import itertools
+import re
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from datetime import datetime, timezone
 from pathlib import Path
 import httpx
+import orjson
 from mcp.server.fastmcp import FastMCP
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stderr
-)
-logger = logging.getLogger("burpsuite-server")
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
-mcp = FastMCP("burpsuite")
+_log_queue = queue.SimpleQueue()
+_stderr_handler = logging.StreamHandler(sys.stderr)
+_stderr_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+_log_listener = QueueListener(_log_queue, _stderr_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+logging.root.setLevel(logging.INFO)
+logging.root.addHandler(QueueHandler(_log_queue))
+logger = logging.getLogger("burpsuite-server")
 
 BURP_PROXY_HOST = os.environ.get("BURP_PROXY_HOST", "host.docker.internal")
 BURP_PROXY_PORT = os.environ.get("BURP_PROXY_PORT", "8087")
 BURP_API_PORT = os.environ.get("BURP_API_PORT", "1337")
+BURP_PROXY_URL = f"http://{BURP_PROXY_HOST}:{BURP_PROXY_PORT}"
+BURP_API_URL = f"http://{BURP_PROXY_HOST}:{BURP_API_PORT}"
+MAX_SCAN_HISTORY = int(os.environ.get("MAX_SCAN_HISTORY", "10000"))
+BURP_MAX_CONCURRENCY = int(os.environ.get("BURP_MAX_CONCURRENCY", "20"))
 REPORTS_DIR = Path("/app/reports")
 FINDINGS_DIR = Path("/app/findings")
 
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
 FINDINGS_DIR.mkdir(parents=True, exist_ok=True)
 
+SEVERITY_ORDER = ["critical", "high", "medium", "low", "info"]
+VALID_SEVERITIES = frozenset(SEVERITY_ORDER)
+VALID_STATUSES = frozenset({"open", "confirmed", "resolved", "false_positive", "accepted"})
+VALID_DEPTHS = frozenset({"quick", "standard", "deep"})
+
 session_data = {
     "target": "",
     "scope": [],
+    "scope_set": set(),
+    "scope_rendered": "",
     "findings": [],
-    "scan_history": [],
+    "findings_by_id": {},
+    "findings_by_severity": {sev: [] for sev in SEVERITY_ORDER},
+    "scan_history": deque(maxlen=MAX_SCAN_HISTORY),
+    "scan_history_by_id": {},
     "current_workflow": None
 }
 
+_clients = {}
+
+def get_client(proxy=None):
+    """Return the shared pooled client for the given proxy (None for direct).
+
+    HTTP/2 is only negotiated on the direct client; Burp's proxy listener speaks HTTP/1.1.
+    """
+    client = _clients.get(proxy)
+    if client is None:
+        transport = httpx.AsyncHTTPTransport(
+            proxy=httpx.Proxy(proxy) if proxy else None,
+            verify=False,
+            http2=proxy is None,
+            retries=0,
+            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100, keepalive_expiry=30)
+        )
+        client = httpx.AsyncClient(transport=transport, timeout=httpx.Timeout(30.0))
+        _clients[proxy] = client
+    return client
+
+@lru_cache(maxsize=256)
+def parse_url(raw):
+    return httpx.URL(raw)
+
+async def close_clients():
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+class RequestBatcher:
+    """Queue outbound proxy requests and dispatch them in small concurrent batches."""
+
+    def __init__(self, max_batch_size=16, max_queue_time=0.01, max_concurrency=BURP_MAX_CONCURRENCY):
+        self.max_batch_size = max_batch_size
+        self.max_queue_time = max_queue_time
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._queue = None
+        self._worker = None
+        self._dispatches = set()
+
+    async def process(self, request):
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self.run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((request, future))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_queue_time
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            task = asyncio.create_task(self._dispatch(batch))
+            self._dispatches.add(task)
+            task.add_done_callback(self._dispatches.discard)
+
+    async def _dispatch(self, batch):
+        results = await asyncio.gather(*(self._send(request) for request, _ in batch), return_exceptions=True)
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def _send(self, request):
+        client = get_client(BURP_PROXY_URL)
+        async with self._semaphore:
+            return await client.send(client.build_request(**request))
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+        for task in list(self._dispatches):
+            task.cancel()
+
+_batcher = RequestBatcher()
+
+@asynccontextmanager
+async def server_lifespan(server):
+    try:
+        yield {}
+    finally:
+        await _batcher.close()
+        await close_clients()
+
+mcp = FastMCP("burpsuite", lifespan=server_lifespan)
+
 def get_burp_api_url():
-    return f"http://{BURP_PROXY_HOST}:{BURP_API_PORT}"
+    return BURP_API_URL
 
 def get_burp_proxy_url():
-    return f"http://{BURP_PROXY_HOST}:{BURP_PROXY_PORT}"
+    return BURP_PROXY_URL
+
+_inflight = {}
+# Proxied GET and DELETE requests never carry a body
+BODYLESS_METHODS = frozenset({"GET", "DELETE"})
+
+async def _proxied_request(method, url, headers, body):
+    content = None if method in BODYLESS_METHODS else body or None
+    return await _batcher.process(dict(method=method, url=parse_url(url), headers=headers, content=content))
 
 async def send_request_through_proxy(method, url, headers=None, body=""):
-    proxy_url = get_burp_proxy_url()
-    async with httpx.AsyncClient(proxy=proxy_url, timeout=30, verify=False) as client:
-        if method.upper() == "GET":
-            response = await client.get(url, headers=headers)
-        elif method.upper() == "POST":
-            response = await client.post(url, headers=headers, content=body)
-        elif method.upper() == "PUT":
-            response = await client.put(url, headers=headers, content=body)
-        elif method.upper() == "DELETE":
-            response = await client.delete(url, headers=headers)
-        else:
-            response = await client.request(method, url, headers=headers, content=body)
-        return response
+    """Send a request through Burp via the batcher, capped at BURP_MAX_CONCURRENCY in flight.
+
+    Identical concurrent GETs share a single upstream request.
+    """
+    method = method.upper()
+    if method != "GET":
+        return await _proxied_request(method, url, headers, body)
+    
+    try:
+        key = (url, frozenset((headers or {}).items()))
+        task = _inflight.get(key)
+    except TypeError:
+        return await _proxied_request(method, url, headers, body)
+    
+    if task is None:
+        task = asyncio.ensure_future(_proxied_request(method, url, headers, body))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+@lru_cache(maxsize=256)
+def parse_headers(raw):
+    return orjson.loads(raw)
+
+def _now_iso():
+    """UTC timestamp in datetime.isoformat() layout, built without a datetime object."""
+    ns = time.time_ns()
+    secs, us = divmod(ns // 1000, 1_000_000)
+    tm = time.gmtime(secs)
+    return f"{tm.tm_year:04d}-{tm.tm_mon:02d}-{tm.tm_mday:02d}T{tm.tm_hour:02d}:{tm.tm_min:02d}:{tm.tm_sec:02d}.{us:06d}+00:00"
+
+def add_scope_entry(entry):
+    """Add an entry to the scope, refreshing the cached listing. Returns False if already present."""
+    if entry in session_data["scope_set"]:
+        return False
+    session_data["scope"].append(entry)
+    session_data["scope_set"].add(entry)
+    session_data["scope_rendered"] = "\n".join(f"  - {s}" for s in session_data["scope"])
+    return True
+
+def safe_tool(fn=None, *, error_prefix=""):
+    """Wrap a tool so uncaught exceptions are logged and returned as an [ERROR] message."""
+    if fn is None:
+        return functools.partial(safe_tool, error_prefix=error_prefix)
+    prefix = f"{error_prefix}: " if error_prefix else ""
+    
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        except httpx.ConnectError as e:
+            return f"[ERROR] Connection Error: {e}"
+        except Exception as e:
+            logger.exception(f"{fn.__name__} failed")
+            return f"[ERROR] {prefix}{e}"
+    return wrapper
+
+_finding_counter = itertools.count(1)
 
 def generate_finding_id():
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
-    count = len(session_data["findings"]) + 1
-    return f"FINDING-{timestamp}-{count:04d}"
+    n = next(_finding_counter)
+    t = datetime.now(timezone.utc)
+    return f"FINDING-{t.year:04d}{t.month:02d}{t.day:02d}{t.hour:02d}{t.minute:02d}{t.second:02d}-{n:04d}"
+
+RECON_DEPTHS = {
+    "quick": {"spider": False, "dirs": 100, "timeout": 60},
+    "standard": {"spider": True, "dirs": 500, "timeout": 300},
+    "deep": {"spider": True, "dirs": 2000, "timeout": 900}
+}
+
+WORDLISTS = {
+    "common": "/app/wordlists/common.txt",
+    "medium": "/app/wordlists/directory-medium.txt",
+    "large": "/app/wordlists/directory-large.txt",
+    "api": "/app/wordlists/api-endpoints.txt",
+    "backup": "/app/wordlists/backup-files.txt"
+}
+
+DEFAULT_EXTENSIONS = ["", ".php", ".asp", ".aspx", ".jsp", ".html", ".js"]
+
+SCAN_TYPES = {
+    "passive": {
+        "description": "Non-intrusive analysis of responses",
+        "checks": ["Information disclosure", "Missing headers", "Cookie flags", "Version exposure", "Comments/debug info"]
+    },
+    "light": {
+        "description": "Safe active checks",
+        "checks": ["Reflected XSS", "Open redirects", "Path traversal", "CORS misconfig", "Clickjacking"]
+    },
+    "active": {
+        "description": "Full vulnerability scanning (may modify data)",
+        "checks": ["SQL Injection", "Command Injection", "SSRF", "XXE", "Deserialization", "Authentication bypass"]
+    }
+}
+
+SCAN_CHECKS_RENDERED = {
+    name: "\n".join(f"    - {c}" for c in config["checks"]) for name, config in SCAN_TYPES.items()
+}
+
+INJECTION_PAYLOADS = {
+    "sql": [
+        "' OR '1'='1",
+        "' OR '1'='1'--",
+        "1' ORDER BY 1--",
+        "1 UNION SELECT NULL--",
+        "'; WAITFOR DELAY '0:0:5'--"
+    ],
+    "command": [
+        "; ls -la",
+        "| cat /etc/passwd",
+        "`id`",
+        "$(whoami)",
+        "| sleep 5"
+    ],
+    "ldap": [
+        "*",
+        "*)(&",
+        "*)(uid=*))(|(uid=*"
+    ],
+    "xpath": [
+        "' or '1'='1",
+        "' or ''='"
+    ],
+    "nosql": [
+        '{"$gt": ""}',
+        '{"$ne": ""}'
+    ]
+}
+
+INJECTION_PAYLOADS_RENDERED = {
+    name: "\n".join(f"    {i+1}. {p}" for i, p in enumerate(payloads)) for name, payloads in INJECTION_PAYLOADS.items()
+}
+
+XSS_PAYLOADS = {
+    "html": [
+        "<script>alert('XSS')</script>",
+        "<img src=x onerror=alert('XSS')>",
+        "<svg onload=alert('XSS')>"
+    ],
+    "attribute": [
+        "\" onmouseover=\"alert(1)",
+        "' onfocus='alert(1)' autofocus='"
+    ],
+    "javascript": [
+        "';alert('XSS');//",
+        "'-alert('XSS')-'"
+    ],
+    "url": [
+        "javascript:alert(1)",
+        "data:text/html,<script>alert(1)</script>"
+    ]
+}
+
+XSS_PAYLOADS_RENDERED = {
+    name: "\n".join(f"    {i+1}. {p}" for i, p in enumerate(payloads)) for name, payloads in XSS_PAYLOADS.items()
+}
+
+AUTH_TESTS = {
+    "brute": {
+        "name": "Brute Force",
+        "checks": ["Default credentials", "Common password lists", "Username enumeration", "Rate limiting bypass"]
+    },
+    "bypass": {
+        "name": "Authentication Bypass",
+        "checks": ["SQL injection in login", "Direct page access", "Parameter manipulation", "JWT/token manipulation"]
+    },
+    "session": {
+        "name": "Session Management",
+        "checks": ["Session fixation", "Session token predictability", "Concurrent session handling", "Logout functionality"]
+    }
+}
+
+AUTH_TESTS_RENDERED = {
+    name: "{}:\n{}\n\n".format(test["name"], "\n".join(f"      - {c}" for c in test["checks"]))
+    for name, test in AUTH_TESTS.items()
+}
+AUTH_TESTS_RENDERED["all"] = "".join(AUTH_TESTS_RENDERED.values())
+
+WORKFLOWS = {
+    "quick_scan": {
+        "name": "Quick Security Scan",
+        "steps": [
+            "1. Technology fingerprinting",
+            "2. Port and service detection",
+            "3. Common vulnerability checks",
+            "4. Security header analysis",
+            "5. SSL/TLS configuration review"
+        ],
+        "duration": "15-30 minutes"
+    },
+    "owasp_top10": {
+        "name": "OWASP Top 10 Assessment",
+        "steps": [
+            "1. A01 - Broken Access Control testing",
+            "2. A02 - Cryptographic failures check",
+            "3. A03 - Injection testing (SQL, Command, etc.)",
+            "4. A04 - Insecure design review",
+            "5. A05 - Security misconfiguration",
+            "6. A06 - Vulnerable components scan",
+            "7. A07 - Authentication testing",
+            "8. A08 - Software integrity verification",
+            "9. A09 - Logging and monitoring check",
+            "10. A10 - SSRF testing"
+        ],
+        "duration": "2-4 hours"
+    },
+    "api_security": {
+        "name": "API Security Assessment",
+        "steps": [
+            "1. API endpoint discovery",
+            "2. Authentication mechanism analysis",
+            "3. Authorization testing (BOLA/IDOR)",
+            "4. Rate limiting verification",
+            "5. Input validation testing",
+            "6. Data exposure analysis",
+            "7. Error handling review"
+        ],
+        "duration": "1-2 hours"
+    },
+    "authentication": {
+        "name": "Authentication Security Review",
+        "steps": [
+            "1. Login mechanism analysis",
+            "2. Password policy verification",
+            "3. Session management testing",
+            "4. Multi-factor authentication review",
+            "5. Account lockout testing",
+            "6. Password reset flow analysis",
+            "7. Remember me functionality"
+        ],
+        "duration": "1-2 hours"
+    }
+}
+
+WORKFLOW_STEPS_RENDERED = {
+    name: "\n".join(f"  {s}" for s in workflow["steps"]) for name, workflow in WORKFLOWS.items()
+}
+WORKFLOWS_LISTING = "\n".join(f"  - {k}: {v['name']}" for k, v in WORKFLOWS.items())
+
+SECURITY_PATTERNS = {
+    "SQL Error": ["mysql", "sqlite", "postgresql", "ora-", "sql syntax", "sqlstate"],
+    "Path Disclosure": ["/var/www", "/home/", "c:\\", "\\users\\", "/usr/"],
+    "Stack Trace": ["traceback", "exception", "error at line", "stack trace"],
+    "Debug Info": ["debug", "phpinfo", "server_software", "x-powered-by"],
+    "Sensitive Data": ["password", "secret", "api_key", "token", "bearer"],
+    "Version Disclosure": ["version", "powered by", "server:", "x-aspnet-version"]
+}
+
+# Drop patterns that contain a shorter pattern of the same category (e.g. "x-aspnet-version"
+# vs "version"): the shorter one always matches too, so the longer adds states but no hits.
+SECURITY_PATTERNS = {
+    issue_type: [p for p in patterns if not any(q != p and q in p for q in patterns)]
+    for issue_type, patterns in SECURITY_PATTERNS.items()
+}
+
+PATTERN_TO_ISSUE = {pattern: issue_type for issue_type, patterns in SECURITY_PATTERNS.items() for pattern in patterns}
+
+# Tags counted in the same pass as the security patterns
+COUNTED_TAGS = ("<form", "<script")
+RESPONSE_SCAN_PATTERNS = [*PATTERN_TO_ISSUE, *COUNTED_TAGS]
+
+# Aho-Corasick when pyahocorasick is installed, otherwise one case-insensitive alternation.
+RESPONSE_AUTOMATON = None
+if ahocorasick is not None:
+    RESPONSE_AUTOMATON = ahocorasick.Automaton()
+    for _pattern in RESPONSE_SCAN_PATTERNS:
+        RESPONSE_AUTOMATON.add_word(_pattern, _pattern)
+    RESPONSE_AUTOMATON.make_automaton()
+RESPONSE_PATTERN_RE = re.compile("|".join(re.escape(p) for p in RESPONSE_SCAN_PATTERNS), re.IGNORECASE)
+RESPONSE_SCAN_WINDOW = 64 * 1024
+RESPONSE_PATTERN_OVERLAP = max(map(len, RESPONSE_SCAN_PATTERNS)) - 1
+
+class HtmlNumericTable(dict):
+    """str.translate table mapping each code point to its &#N; entity, filled on demand."""
+
+    def __missing__(self, codepoint):
+        entity = self[codepoint] = f"&#{codepoint};"
+        return entity
+
+HTML_NUMERIC_TABLE = HtmlNumericTable((c, f"&#{c};") for c in range(256))
+HEX_PREFIX_RE = re.compile(r"\\x|0x")
+
+def iter_response_patterns(body):
+    """Yield each security pattern or counted tag occurrence in body, lower-cased, in a single pass.
+
+    The automaton is case-sensitive, so the body is lowered one window at a time rather
+    than copied whole; windows overlap by the longest pattern so boundary matches are kept.
+    """
+    if RESPONSE_AUTOMATON is not None:
+        for start in range(0, len(body), RESPONSE_SCAN_WINDOW):
+            lo = max(start - RESPONSE_PATTERN_OVERLAP, 0)
+            seen = len(body[lo:start].lower())
+            for end, pattern in RESPONSE_AUTOMATON.iter(body[lo:start + RESPONSE_SCAN_WINDOW].lower()):
+                if end >= seen:
+                    yield pattern
+    else:
+        for match in RESPONSE_PATTERN_RE.finditer(body):
+            yield match.group(0).lower()
 
 @mcp.tool()
+@safe_tool(error_prefix="Error setting target")
 async def set_target(url: str = "") -> str:
     """Set the target URL for the penetration test."""
     if not url.strip():
         return "[ERROR] Target URL is required. Example: set_target('https://example.com')"
     
-    try:
-        if not url.startswith(("http://", "https://")):
-            url = f"https://{url}"
-        
-        session_data["target"] = url
-        session_data["scope"].append(url)
-        
-        logger.info(f"Target set to: {url}")
-        
-        result = "[OK] Target configured successfully!\n\n"
-        result += f"[TARGET] Primary Target: {url}\n\n"
-        result += "Next Steps:\n"
-        result += "1. Use add_to_scope to add additional domains/paths\n"
-        result += "2. Use start_reconnaissance to begin automated discovery\n"
-        result += "3. Use send_request to manually explore endpoints\n\n"
-        result += "[WARNING] Ensure you have authorization to test this target."
-        return result
-    except Exception as e:
-        logger.error(f"Error setting target: {e}")
-        return f"[ERROR] Error setting target: {str(e)}"
+    if not url.startswith(("http://", "https://")):
+        url = f"https://{url}"
+    
+    session_data["target"] = url
+    add_scope_entry(url)
+    
+    logger.info(f"Target set to: {url}")
+    
+    return (
+        "[OK] Target configured successfully!\n\n"
+        f"[TARGET] Primary Target: {url}\n\n"
+        "Next Steps:\n"
+        "1. Use add_to_scope to add additional domains/paths\n"
+        "2. Use start_reconnaissance to begin automated discovery\n"
+        "3. Use send_request to manually explore endpoints\n\n"
+        "[WARNING] Ensure you have authorization to test this target."
+    )
 
 @mcp.tool()
+@safe_tool
 async def add_to_scope(url_pattern: str = "") -> str:
     """Add a URL pattern to the testing scope."""
     if not url_pattern.strip():
         return "[ERROR] URL pattern is required. Example: add_to_scope('*.example.com')"
     
-    try:
-        if url_pattern not in session_data["scope"]:
-            session_data["scope"].append(url_pattern)
-            logger.info(f"Added to scope: {url_pattern}")
-        
-        scope_list = "\n".join([f"  - {s}" for s in session_data["scope"]])
-        return f"[OK] Scope updated!\n\nCurrent Scope:\n{scope_list}"
-    except Exception as e:
-        logger.error(f"Error adding to scope: {e}")
-        return f"[ERROR] {str(e)}"
+    if add_scope_entry(url_pattern):
+        logger.info(f"Added to scope: {url_pattern}")
+    
+    return f"[OK] Scope updated!\n\nCurrent Scope:\n{session_data['scope_rendered']}"
 
 @mcp.tool()
+@safe_tool
 async def get_scope() -> str:
     """Get the current testing scope configuration."""
-    try:
-        if not session_data["scope"]:
-            return "[LIST] Scope: No targets configured. Use set_target to begin."
-        
-        scope_list = "\n".join([f"  - {s}" for s in session_data["scope"]])
-        result = "[LIST] Current Testing Scope\n\n"
-        result += f"[TARGET] Primary Target: {session_data.get('target', 'Not set')}\n\n"
-        result += f"In-Scope URLs/Patterns:\n{scope_list}\n\n"
-        result += f"Session Stats:\n"
-        result += f"  - Findings: {len(session_data['findings'])}\n"
-        result += f"  - Scans completed: {len(session_data['scan_history'])}"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    if not session_data["scope"]:
+        return "[LIST] Scope: No targets configured. Use set_target to begin."
+    
+    scope_list = session_data["scope_rendered"]
+    return (
+        "[LIST] Current Testing Scope\n\n"
+        f"[TARGET] Primary Target: {session_data.get('target', 'Not set')}\n\n"
+        f"In-Scope URLs/Patterns:\n{scope_list}\n\n"
+        "Session Stats:\n"
+        f"  - Findings: {len(session_data['findings'])}\n"
+        f"  - Scans completed: {len(session_data['scan_history'])}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def send_request(url: str = "", method: str = "GET", headers: str = "", body: str = "", through_proxy: str = "true") -> str:
     """Send an HTTP request optionally through Burp proxy."""
     if not url.strip():
@@ -136,8 +550,8 @@ async def send_request(url: str = "", method: str = "GET", headers: str = "", bo
         header_dict = {}
         if headers.strip():
             try:
-                header_dict = json.loads(headers)
-            except json.JSONDecodeError:
+                header_dict = dict(parse_headers(headers))
+            except orjson.JSONDecodeError:
                 return "[ERROR] Headers must be valid JSON. Example: {\"Cookie\": \"session=abc\"}"
         
         use_proxy = through_proxy.lower() == "true"
@@ -145,802 +559,630 @@ async def send_request(url: str = "", method: str = "GET", headers: str = "", bo
         if use_proxy:
             response = await send_request_through_proxy(method, url, header_dict, body)
         else:
-            async with httpx.AsyncClient(timeout=30, verify=False) as client:
-                response = await client.request(method, url, headers=header_dict, content=body if body else None)
+            response = await get_client().request(method, url, headers=header_dict, content=body if body else None)
         
-        response_headers = "\n".join([f"  {k}: {v}" for k, v in response.headers.items()])
-        body_preview = response.text[:1000] if response.text else "(empty)"
-        if len(response.text) > 1000:
-            body_preview += f"\n... (truncated, {len(response.text)} total bytes)"
+        response_headers = "\n".join(f"  {k}: {v}" for k, v in response.headers.items())
+        response_body = response.content
+        total_bytes = len(response_body)
+        body_preview = response_body[:1000].decode(response.encoding or "utf-8", errors="replace") if response_body else "(empty)"
+        if total_bytes > 1000:
+            body_preview = f"{body_preview}\n... (truncated, {total_bytes} total bytes)"
         
         proxy_status = "[OK] Through Burp Proxy" if use_proxy else "Direct Connection"
         
-        result = f"[SEND] Request Sent ({proxy_status})\n\n"
-        result += f"Request:\n  {method} {url}\n\n"
-        result += f"Response:\n  Status: {response.status_code} {response.reason_phrase}\n\n"
-        result += f"Headers:\n{response_headers}\n\n"
-        result += f"Body Preview:\n{body_preview}"
-        return result
+        return (
+            f"[SEND] Request Sent ({proxy_status})\n\n"
+            f"Request:\n  {method} {url}\n\n"
+            f"Response:\n  Status: {response.status_code} {response.reason_phrase}\n\n"
+            f"Headers:\n{response_headers}\n\n"
+            f"Body Preview:\n{body_preview}"
+        )
     except httpx.ConnectError:
         if through_proxy.lower() == "true":
-            return f"[ERROR] Connection Error: Cannot connect to Burp proxy at {get_burp_proxy_url()}. Ensure Burp Suite is running."
+            return f"[ERROR] Connection Error: Cannot connect to Burp proxy at {BURP_PROXY_URL}. Ensure Burp Suite is running."
         return f"[ERROR] Connection Error: Cannot connect to {url}"
-    except Exception as e:
-        logger.error(f"Request error: {e}")
-        return f"[ERROR] {str(e)}"
 
 @mcp.tool()
+@safe_tool
 async def start_reconnaissance(target: str = "", depth: str = "standard") -> str:
     """Start automated reconnaissance on target."""
     target_url = target.strip() or session_data.get("target", "")
     if not target_url:
         return "[ERROR] No target specified. Use set_target first or provide a target URL."
     
-    try:
-        valid_depths = ["quick", "standard", "deep"]
-        if depth not in valid_depths:
-            depth = "standard"
-        
-        scan_id = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
-        
-        scan_record = {
-            "id": scan_id,
-            "target": target_url,
-            "type": "reconnaissance",
-            "depth": depth,
-            "started": datetime.now(timezone.utc).isoformat(),
-            "status": "running"
-        }
-        session_data["scan_history"].append(scan_record)
-        
-        depth_config = {
-            "quick": {"spider": False, "dirs": 100, "timeout": 60},
-            "standard": {"spider": True, "dirs": 500, "timeout": 300},
-            "deep": {"spider": True, "dirs": 2000, "timeout": 900}
-        }
-        config = depth_config[depth]
-        
-        result = "[SEARCH] Reconnaissance Started\n\n"
-        result += f"Scan ID: {scan_id}\n"
-        result += f"Target: {target_url}\n"
-        result += f"Depth: {depth.capitalize()}\n\n"
-        result += f"Configuration:\n"
-        result += f"  - Spider enabled: {config['spider']}\n"
-        result += f"  - Directory entries: {config['dirs']}\n"
-        result += f"  - Timeout: {config['timeout']}s\n\n"
-        result += "Recommended Workflow:\n"
-        result += "1. Monitor progress with get_scan_status\n"
-        result += "2. Review findings with get_findings\n"
-        result += "3. Perform targeted testing on discovered endpoints"
-        return result
-    except Exception as e:
-        logger.error(f"Reconnaissance error: {e}")
-        return f"[ERROR] {str(e)}"
+    if depth not in VALID_DEPTHS:
+        depth = "standard"
+    
+    scan_id = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    
+    scan_record = {
+        "id": scan_id,
+        "target": target_url,
+        "type": "reconnaissance",
+        "depth": depth,
+        "started": _now_iso(),
+        "status": "running"
+    }
+    history = session_data["scan_history"]
+    if len(history) == history.maxlen:
+        session_data["scan_history_by_id"].pop(history[0]["id"], None)
+    history.append(scan_record)
+    session_data["scan_history_by_id"][scan_id] = scan_record
+    
+    config = RECON_DEPTHS[depth]
+    
+    return (
+        "[SEARCH] Reconnaissance Started\n\n"
+        f"Scan ID: {scan_id}\n"
+        f"Target: {target_url}\n"
+        f"Depth: {depth.capitalize()}\n\n"
+        "Configuration:\n"
+        f"  - Spider enabled: {config['spider']}\n"
+        f"  - Directory entries: {config['dirs']}\n"
+        f"  - Timeout: {config['timeout']}s\n\n"
+        "Recommended Workflow:\n"
+        "1. Monitor progress with get_scan_status\n"
+        "2. Review findings with get_findings\n"
+        "3. Perform targeted testing on discovered endpoints"
+    )
 
 @mcp.tool()
+@safe_tool
 async def discover_directories(target: str = "", wordlist: str = "common", extensions: str = "") -> str:
     """Discover hidden directories and files using wordlist-based enumeration."""
     target_url = target.strip() or session_data.get("target", "")
     if not target_url:
         return "[ERROR] No target specified"
     
-    try:
-        wordlists = {
-            "common": "/app/wordlists/common.txt",
-            "medium": "/app/wordlists/directory-medium.txt",
-            "large": "/app/wordlists/directory-large.txt",
-            "api": "/app/wordlists/api-endpoints.txt",
-            "backup": "/app/wordlists/backup-files.txt"
-        }
-        
-        wordlist_path = wordlists.get(wordlist, wordlists["common"])
-        ext_list = extensions.split(",") if extensions else ["", ".php", ".asp", ".aspx", ".jsp", ".html", ".js"]
-        
-        result = "[DIR] Directory Discovery Configuration\n\n"
-        result += f"Target: {target_url}\n"
-        result += f"Wordlist: {wordlist} ({wordlist_path})\n"
-        result += f"Extensions: {', '.join(ext_list) if ext_list else 'None'}\n\n"
-        result += "To execute in Burp Suite:\n"
-        result += f"1. Open Intruder\n"
-        result += f"2. Set target to: {target_url}/[directory]\n"
-        result += f"3. Load wordlist: {wordlist_path}\n"
-        result += "4. Configure extensions as payload processing\n"
-        result += "5. Start attack"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    
+    wordlist_path = WORDLISTS.get(wordlist, WORDLISTS["common"])
+    ext_list = extensions.split(",") if extensions else DEFAULT_EXTENSIONS
+    
+    return (
+        "[DIR] Directory Discovery Configuration\n\n"
+        f"Target: {target_url}\n"
+        f"Wordlist: {wordlist} ({wordlist_path})\n"
+        f"Extensions: {', '.join(ext_list) if ext_list else 'None'}\n\n"
+        "To execute in Burp Suite:\n"
+        "1. Open Intruder\n"
+        f"2. Set target to: {target_url}/[directory]\n"
+        f"3. Load wordlist: {wordlist_path}\n"
+        "4. Configure extensions as payload processing\n"
+        "5. Start attack"
+    )
 
 @mcp.tool()
+@safe_tool
 async def scan_vulnerabilities(target: str = "", scan_type: str = "passive") -> str:
     """Scan for vulnerabilities - scan_type can be passive, light, or active."""
     target_url = target.strip() or session_data.get("target", "")
     if not target_url:
         return "[ERROR] No target specified"
     
-    try:
-        scan_types = {
-            "passive": {
-                "description": "Non-intrusive analysis of responses",
-                "checks": ["Information disclosure", "Missing headers", "Cookie flags", "Version exposure", "Comments/debug info"]
-            },
-            "light": {
-                "description": "Safe active checks",
-                "checks": ["Reflected XSS", "Open redirects", "Path traversal", "CORS misconfig", "Clickjacking"]
-            },
-            "active": {
-                "description": "Full vulnerability scanning (may modify data)",
-                "checks": ["SQL Injection", "Command Injection", "SSRF", "XXE", "Deserialization", "Authentication bypass"]
-            }
-        }
-        
-        if scan_type not in scan_types:
-            scan_type = "passive"
-        
-        config = scan_types[scan_type]
-        checks_list = "\n".join([f"    - {c}" for c in config["checks"]])
-        
-        result = "[SCAN] Vulnerability Scan Configuration\n\n"
-        result += f"Target: {target_url}\n"
-        result += f"Scan Type: {scan_type.capitalize()}\n"
-        result += f"Description: {config['description']}\n\n"
-        result += f"Checks to perform:\n{checks_list}\n\n"
-        if scan_type == "active":
-            result += "[WARNING] ACTIVE scanning may modify application data!\n"
-        else:
-            result += "This scan type is safe and non-destructive.\n"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    
+    if scan_type not in SCAN_TYPES:
+        scan_type = "passive"
+    
+    config = SCAN_TYPES[scan_type]
+    checks_list = SCAN_CHECKS_RENDERED[scan_type]
+    
+    if scan_type == "active":
+        safety_note = "[WARNING] ACTIVE scanning may modify application data!\n"
+    else:
+        safety_note = "This scan type is safe and non-destructive.\n"
+    
+    return (
+        "[SCAN] Vulnerability Scan Configuration\n\n"
+        f"Target: {target_url}\n"
+        f"Scan Type: {scan_type.capitalize()}\n"
+        f"Description: {config['description']}\n\n"
+        f"Checks to perform:\n{checks_list}\n\n"
+        f"{safety_note}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def test_injection(url: str = "", parameter: str = "", injection_type: str = "sql") -> str:
     """Test a parameter for injection vulnerabilities."""
     if not url.strip() or not parameter.strip():
         return "[ERROR] Both URL and parameter name are required"
     
-    try:
-        payloads = {
-            "sql": [
-                "' OR '1'='1",
-                "' OR '1'='1'--",
-                "1' ORDER BY 1--",
-                "1 UNION SELECT NULL--",
-                "'; WAITFOR DELAY '0:0:5'--"
-            ],
-            "command": [
-                "; ls -la",
-                "| cat /etc/passwd",
-                "`id`",
-                "$(whoami)",
-                "| sleep 5"
-            ],
-            "ldap": [
-                "*",
-                "*)(&",
-                "*)(uid=*))(|(uid=*"
-            ],
-            "xpath": [
-                "' or '1'='1",
-                "' or ''='"
-            ],
-            "nosql": [
-                '{"$gt": ""}',
-                '{"$ne": ""}'
-            ]
-        }
-        
-        selected_payloads = payloads.get(injection_type, payloads["sql"])
-        payloads_list = "\n".join([f"    {i+1}. {p}" for i, p in enumerate(selected_payloads)])
-        
-        result = "[INJECT] Injection Testing Configuration\n\n"
-        result += f"Target URL: {url}\n"
-        result += f"Parameter: {parameter}\n"
-        result += f"Injection Type: {injection_type.upper()}\n\n"
-        result += f"Test Payloads:\n{payloads_list}\n\n"
-        result += "Testing Methodology:\n"
-        result += "1. Send baseline request to establish normal response\n"
-        result += "2. Inject each payload and compare responses\n"
-        result += "3. Look for: errors, timing differences, data leakage"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    
+    payloads_list = INJECTION_PAYLOADS_RENDERED.get(injection_type, INJECTION_PAYLOADS_RENDERED["sql"])
+    
+    return (
+        "[INJECT] Injection Testing Configuration\n\n"
+        f"Target URL: {url}\n"
+        f"Parameter: {parameter}\n"
+        f"Injection Type: {injection_type.upper()}\n\n"
+        f"Test Payloads:\n{payloads_list}\n\n"
+        "Testing Methodology:\n"
+        "1. Send baseline request to establish normal response\n"
+        "2. Inject each payload and compare responses\n"
+        "3. Look for: errors, timing differences, data leakage"
+    )
 
 @mcp.tool()
+@safe_tool
 async def test_xss(url: str = "", parameter: str = "", context: str = "html") -> str:
     """Test for XSS vulnerabilities."""
     if not url.strip() or not parameter.strip():
         return "[ERROR] Both URL and parameter name are required"
     
-    try:
-        payloads = {
-            "html": [
-                "<script>alert('XSS')</script>",
-                "<img src=x onerror=alert('XSS')>",
-                "<svg onload=alert('XSS')>"
-            ],
-            "attribute": [
-                "\" onmouseover=\"alert(1)",
-                "' onfocus='alert(1)' autofocus='"
-            ],
-            "javascript": [
-                "';alert('XSS');//",
-                "'-alert('XSS')-'"
-            ],
-            "url": [
-                "javascript:alert(1)",
-                "data:text/html,<script>alert(1)</script>"
-            ]
-        }
-        
-        selected_payloads = payloads.get(context, payloads["html"])
-        payloads_list = "\n".join([f"    {i+1}. {p}" for i, p in enumerate(selected_payloads)])
-        
-        result = "[XSS] XSS Testing Configuration\n\n"
-        result += f"Target URL: {url}\n"
-        result += f"Parameter: {parameter}\n"
-        result += f"Context: {context}\n\n"
-        result += f"Test Payloads (context-specific):\n{payloads_list}\n\n"
-        result += "Testing Approach:\n"
-        result += "1. Identify where input is reflected\n"
-        result += "2. Determine the rendering context\n"
-        result += "3. Craft payload to break out of context\n"
-        result += "4. Verify JavaScript execution"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    
+    payloads_list = XSS_PAYLOADS_RENDERED.get(context, XSS_PAYLOADS_RENDERED["html"])
+    
+    return (
+        "[XSS] XSS Testing Configuration\n\n"
+        f"Target URL: {url}\n"
+        f"Parameter: {parameter}\n"
+        f"Context: {context}\n\n"
+        f"Test Payloads (context-specific):\n{payloads_list}\n\n"
+        "Testing Approach:\n"
+        "1. Identify where input is reflected\n"
+        "2. Determine the rendering context\n"
+        "3. Craft payload to break out of context\n"
+        "4. Verify JavaScript execution"
+    )
 
 @mcp.tool()
+@safe_tool
 async def test_authentication(url: str = "", test_type: str = "all") -> str:
     """Test authentication mechanisms."""
     if not url.strip():
         return "[ERROR] URL is required"
     
-    try:
-        tests = {
-            "brute": {
-                "name": "Brute Force",
-                "checks": ["Default credentials", "Common password lists", "Username enumeration", "Rate limiting bypass"]
-            },
-            "bypass": {
-                "name": "Authentication Bypass",
-                "checks": ["SQL injection in login", "Direct page access", "Parameter manipulation", "JWT/token manipulation"]
-            },
-            "session": {
-                "name": "Session Management",
-                "checks": ["Session fixation", "Session token predictability", "Concurrent session handling", "Logout functionality"]
-            }
-        }
-        
-        result = "[AUTH] Authentication Testing\n\n"
-        result += f"Target: {url}\n"
-        result += f"Test Scope: {test_type.capitalize()}\n\n"
-        
-        if test_type == "all":
-            selected_tests = tests
-        else:
-            selected_tests = {test_type: tests.get(test_type, tests["bypass"])}
-        
-        for key, test in selected_tests.items():
-            checks_list = "\n".join([f"      - {c}" for c in test["checks"]])
-            result += f"{test['name']}:\n{checks_list}\n\n"
-        
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    
+    checks = AUTH_TESTS_RENDERED.get(test_type, AUTH_TESTS_RENDERED["bypass"])
+    
+    return (
+        "[AUTH] Authentication Testing\n\n"
+        f"Target: {url}\n"
+        f"Test Scope: {test_type.capitalize()}\n\n"
+        f"{checks}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def add_finding(title: str = "", severity: str = "medium", description: str = "", evidence: str = "", recommendation: str = "") -> str:
     """Add a security finding to the report."""
     if not title.strip():
         return "[ERROR] Finding title is required"
     
-    try:
-        valid_severities = ["critical", "high", "medium", "low", "info"]
-        if severity.lower() not in valid_severities:
-            severity = "medium"
-        
-        finding_id = generate_finding_id()
-        
-        finding = {
-            "id": finding_id,
-            "title": title,
-            "severity": severity.lower(),
-            "description": description or "No description provided",
-            "evidence": evidence or "No evidence attached",
-            "recommendation": recommendation or "Remediation pending",
-            "status": "open",
-            "created": datetime.now(timezone.utc).isoformat(),
-            "target": session_data.get("target", "Unknown")
-        }
-        
-        session_data["findings"].append(finding)
-        
-        logger.info(f"Finding added: {finding_id} - {title}")
-        
-        result = "[OK] Finding Recorded\n\n"
-        result += f"ID: {finding_id}\n"
-        result += f"Severity: {severity.upper()}\n"
-        result += f"Title: {title}\n\n"
-        result += f"Description:\n{description or 'Not provided'}\n\n"
-        result += f"Evidence:\n{evidence or 'Not provided'}\n\n"
-        result += f"Recommendation:\n{recommendation or 'Not provided'}\n\n"
-        result += f"[STATS] Session Stats: {len(session_data['findings'])} total findings"
-        return result
-    except Exception as e:
-        logger.error(f"Error adding finding: {e}")
-        return f"[ERROR] {str(e)}"
+    if severity.lower() not in VALID_SEVERITIES:
+        severity = "medium"
+    
+    finding_id = generate_finding_id()
+    
+    finding = {
+        "id": finding_id,
+        "title": title,
+        "severity": severity.lower(),
+        "description": description or "No description provided",
+        "evidence": evidence or "No evidence attached",
+        "recommendation": recommendation or "Remediation pending",
+        "status": "open",
+        "created": _now_iso(),
+        "target": session_data.get("target", "Unknown")
+    }
+    
+    session_data["findings"].append(finding)
+    session_data["findings_by_id"][finding_id] = finding
+    session_data["findings_by_severity"][finding["severity"]].append(finding)
+    
+    logger.info(f"Finding added: {finding_id} - {title}")
+    
+    return (
+        "[OK] Finding Recorded\n\n"
+        f"ID: {finding_id}\n"
+        f"Severity: {severity.upper()}\n"
+        f"Title: {title}\n\n"
+        f"Description:\n{description or 'Not provided'}\n\n"
+        f"Evidence:\n{evidence or 'Not provided'}\n\n"
+        f"Recommendation:\n{recommendation or 'Not provided'}\n\n"
+        f"[STATS] Session Stats: {len(session_data['findings'])} total findings"
+    )
 
 @mcp.tool()
+@safe_tool
 async def get_findings(severity_filter: str = "", status_filter: str = "") -> str:
     """Get all recorded findings with optional filters."""
-    try:
-        findings = session_data["findings"]
-        
-        if not findings:
-            return "[LIST] Findings Report\n\nNo findings recorded yet.\n\nUse add_finding to record discovered vulnerabilities."
-        
-        if severity_filter:
-            findings = [f for f in findings if f["severity"] == severity_filter.lower()]
-        if status_filter:
-            findings = [f for f in findings if f["status"] == status_filter.lower()]
-        
-        grouped = {}
-        for finding in findings:
-            sev = finding["severity"]
-            if sev not in grouped:
-                grouped[sev] = []
-            grouped[sev].append(finding)
-        
-        result = "[LIST] Security Findings Report\n\n"
-        result += f"Target: {session_data.get('target', 'Not set')}\n"
-        result += f"Total Findings: {len(findings)}\n\n"
-        
-        severity_order = ["critical", "high", "medium", "low", "info"]
-        for sev in severity_order:
-            if sev in grouped:
-                result += f"\n{sev.upper()} ({len(grouped[sev])})\n"
-                for f in grouped[sev]:
-                    result += f"  - [{f['id']}] {f['title']} ({f['status']})\n"
-        
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    findings = session_data["findings"]
+    
+    if not findings:
+        return "[LIST] Findings Report\n\nNo findings recorded yet.\n\nUse add_finding to record discovered vulnerabilities."
+    
+    grouped = session_data["findings_by_severity"]
+    if severity_filter:
+        sev = severity_filter.lower()
+        grouped = {sev: grouped.get(sev, [])}
+    if status_filter:
+        status = status_filter.lower()
+        grouped = {sev: [f for f in fs if f["status"] == status] for sev, fs in grouped.items()}
+    
+    parts = [
+        "[LIST] Security Findings Report\n\n"
+        f"Target: {session_data.get('target', 'Not set')}\n"
+        f"Total Findings: {sum(len(fs) for fs in grouped.values())}\n\n"
+    ]
+    
+    for sev in SEVERITY_ORDER:
+        if grouped.get(sev):
+            parts.append(f"\n{sev.upper()} ({len(grouped[sev])})\n")
+            for f in grouped[sev]:
+                parts.append(f"  - [{f['id']}] {f['title']} ({f['status']})\n")
+    
+    return "".join(parts)
 
 @mcp.tool()
+@safe_tool
 async def get_finding_details(finding_id: str = "") -> str:
     """Get detailed information about a specific finding."""
     if not finding_id.strip():
         return "[ERROR] Finding ID is required"
     
-    try:
-        finding = next((f for f in session_data["findings"] if f["id"] == finding_id), None)
-        
-        if not finding:
-            return f"[ERROR] Finding not found: {finding_id}"
-        
-        result = "[DOC] Finding Details\n\n"
-        result += f"ID: {finding['id']}\n"
-        result += f"Title: {finding['title']}\n"
-        result += f"Severity: {finding['severity'].upper()}\n"
-        result += f"Status: {finding['status'].capitalize()}\n"
-        result += f"Target: {finding['target']}\n"
-        result += f"Created: {finding['created']}\n\n"
-        result += f"Description:\n{finding['description']}\n\n"
-        result += f"Evidence:\n{finding['evidence']}\n\n"
-        result += f"Recommendation:\n{finding['recommendation']}"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    finding = session_data["findings_by_id"].get(finding_id)
+    
+    if not finding:
+        return f"[ERROR] Finding not found: {finding_id}"
+    
+    return (
+        "[DOC] Finding Details\n\n"
+        f"ID: {finding['id']}\n"
+        f"Title: {finding['title']}\n"
+        f"Severity: {finding['severity'].upper()}\n"
+        f"Status: {finding['status'].capitalize()}\n"
+        f"Target: {finding['target']}\n"
+        f"Created: {finding['created']}\n\n"
+        f"Description:\n{finding['description']}\n\n"
+        f"Evidence:\n{finding['evidence']}\n\n"
+        f"Recommendation:\n{finding['recommendation']}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def update_finding(finding_id: str = "", status: str = "", severity: str = "", notes: str = "") -> str:
     """Update a finding status, severity, or add notes."""
     if not finding_id.strip():
         return "[ERROR] Finding ID is required"
     
-    try:
-        finding = next((f for f in session_data["findings"] if f["id"] == finding_id), None)
-        
-        if not finding:
-            return f"[ERROR] Finding not found: {finding_id}"
-        
-        updates = []
-        
-        if status.strip():
-            valid_statuses = ["open", "confirmed", "resolved", "false_positive", "accepted"]
-            if status.lower() in valid_statuses:
-                finding["status"] = status.lower()
-                updates.append(f"Status -> {status}")
-        
-        if severity.strip():
-            valid_severities = ["critical", "high", "medium", "low", "info"]
-            if severity.lower() in valid_severities:
-                finding["severity"] = severity.lower()
-                updates.append(f"Severity -> {severity}")
-        
-        if notes.strip():
-            if "notes" not in finding:
-                finding["notes"] = []
-            finding["notes"].append({
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-                "content": notes
-            })
-            updates.append("Added note")
-        
-        finding["updated"] = datetime.now(timezone.utc).isoformat()
-        
-        if not updates:
-            return "[WARNING] No updates provided. Specify status, severity, or notes."
-        
-        result = "[OK] Finding Updated\n\n"
-        result += f"ID: {finding_id}\n"
-        result += f"Updates: {', '.join(updates)}\n"
-        result += f"Current status: {finding['status']}\n"
-        result += f"Current severity: {finding['severity']}"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    finding = session_data["findings_by_id"].get(finding_id)
+    
+    if not finding:
+        return f"[ERROR] Finding not found: {finding_id}"
+    
+    updates = []
+    
+    if status.strip():
+        if status.lower() in VALID_STATUSES:
+            finding["status"] = status.lower()
+            updates.append(f"Status -> {status}")
+    
+    if severity.strip():
+        if severity.lower() in VALID_SEVERITIES:
+            if finding["severity"] != severity.lower():
+                buckets = session_data["findings_by_severity"]
+                buckets[finding["severity"]].remove(finding)
+                buckets[severity.lower()].append(finding)
+            finding["severity"] = severity.lower()
+            updates.append(f"Severity -> {severity}")
+    
+    now = _now_iso()
+    if notes.strip():
+        if "notes" not in finding:
+            finding["notes"] = []
+        finding["notes"].append({
+            "timestamp": now,
+            "content": notes
+        })
+        updates.append("Added note")
+    
+    finding["updated"] = now
+    
+    if not updates:
+        return "[WARNING] No updates provided. Specify status, severity, or notes."
+    
+    return (
+        "[OK] Finding Updated\n\n"
+        f"ID: {finding_id}\n"
+        f"Updates: {', '.join(updates)}\n"
+        f"Current status: {finding['status']}\n"
+        f"Current severity: {finding['severity']}"
+    )
+
+def _render_finding(f, include_ev):
+    evidence_section = f"\n**Evidence:**\n```\n{f['evidence']}\n```\n" if include_ev else ""
+    return (
+        f"#### {f['id']}: {f['title']}\n\n"
+        f"**Severity:** {f['severity'].upper()} | **Status:** {f['status']}\n\n"
+        f"**Description:**\n{f['description']}\n"
+        f"{evidence_section}"
+        f"\n**Recommendation:**\n{f['recommendation']}\n\n---\n\n"
+    )
+
+def _iter_findings_md(findings_by_severity, include_ev):
+    for sev in SEVERITY_ORDER:
+        sev_findings = findings_by_severity[sev]
+        if sev_findings:
+            yield f"\n### {sev.upper()} Severity\n\n"
+            for f in sev_findings:
+                yield _render_finding(f, include_ev)
 
 @mcp.tool()
+@safe_tool(error_prefix="Error generating report")
 async def generate_report(format_type: str = "markdown", include_evidence: str = "true") -> str:
     """Generate a penetration test report."""
-    try:
-        target = session_data.get("target", "Unknown Target")
-        findings = session_data["findings"]
-        scope = session_data["scope"]
-        
-        include_ev = include_evidence.lower() == "true"
-        
-        severity_counts = {}
-        for f in findings:
-            sev = f["severity"]
-            severity_counts[sev] = severity_counts.get(sev, 0) + 1
-        
-        timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
-        filename = f"pentest_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        if format_type == "json":
-            report_data = {
-                "report": {
-                    "title": "Penetration Test Report",
-                    "target": target,
-                    "generated": timestamp,
-                    "scope": scope,
-                    "summary": severity_counts,
-                    "findings": findings
-                }
+    target = session_data.get("target", "Unknown Target")
+    findings = session_data["findings"]
+    scope = session_data["scope"]
+    
+    include_ev = include_evidence.lower() == "true"
+    
+    findings_by_severity = session_data["findings_by_severity"]
+    severity_counts = {sev: len(fs) for sev, fs in findings_by_severity.items()}
+    
+    timestamp = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC")
+    basename = f"pentest_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    
+    if format_type == "json":
+        report_data = {
+            "report": {
+                "title": "Penetration Test Report",
+                "target": target,
+                "generated": timestamp,
+                "scope": scope,
+                "summary": severity_counts,
+                "findings": findings
             }
-            report_content = json.dumps(report_data, indent=2)
-            filename += ".json"
-        else:
-            findings_md = ""
-            severity_order = ["critical", "high", "medium", "low", "info"]
-            
-            for sev in severity_order:
-                sev_findings = [f for f in findings if f["severity"] == sev]
-                if sev_findings:
-                    findings_md += f"\n### {sev.upper()} Severity\n\n"
-                    for f in sev_findings:
-                        evidence_section = f"\n**Evidence:**\n```\n{f['evidence']}\n```\n" if include_ev else ""
-                        findings_md += f"#### {f['id']}: {f['title']}\n\n"
-                        findings_md += f"**Severity:** {f['severity'].upper()} | **Status:** {f['status']}\n\n"
-                        findings_md += f"**Description:**\n{f['description']}\n"
-                        findings_md += evidence_section
-                        findings_md += f"\n**Recommendation:**\n{f['recommendation']}\n\n---\n\n"
-            
-            report_content = f"# Penetration Test Report\n\n"
-            report_content += f"**Target:** {target}\n"
-            report_content += f"**Generated:** {timestamp}\n"
-            report_content += f"**Scope:** {', '.join(scope) if scope else 'Not defined'}\n\n"
-            report_content += "---\n\n"
-            report_content += "## Executive Summary\n\n"
-            report_content += f"This penetration test assessment identified **{len(findings)}** security findings:\n\n"
-            report_content += f"| Severity | Count |\n|----------|-------|\n"
-            report_content += f"| Critical | {severity_counts.get('critical', 0)} |\n"
-            report_content += f"| High | {severity_counts.get('high', 0)} |\n"
-            report_content += f"| Medium | {severity_counts.get('medium', 0)} |\n"
-            report_content += f"| Low | {severity_counts.get('low', 0)} |\n"
-            report_content += f"| Info | {severity_counts.get('info', 0)} |\n\n"
-            report_content += "---\n\n"
-            report_content += "## Findings\n"
-            report_content += findings_md
-            report_content += "\n---\n\n*Report generated by Burp Suite MCP Server*\n"
-            filename += ".md"
-        
-        report_path = REPORTS_DIR / filename
-        async with aiofiles.open(report_path, 'w') as f:
-            await f.write(report_content)
-        
-        logger.info(f"Report generated: {report_path}")
-        
-        result = "[OK] Report Generated\n\n"
-        result += f"Format: {format_type.upper()}\n"
-        result += f"Filename: {filename}\n"
-        result += f"Path: {report_path}\n\n"
-        result += f"Summary:\n"
-        result += f"  - Total Findings: {len(findings)}\n"
-        result += f"  - Critical: {severity_counts.get('critical', 0)}\n"
-        result += f"  - High: {severity_counts.get('high', 0)}\n"
-        result += f"  - Medium: {severity_counts.get('medium', 0)}\n"
-        result += f"  - Low: {severity_counts.get('low', 0)}\n"
-        result += f"  - Info: {severity_counts.get('info', 0)}"
-        return result
-    except Exception as e:
-        logger.error(f"Report generation error: {e}")
-        return f"[ERROR] Error generating report: {str(e)}"
+        }
+        report_bytes = orjson.dumps(report_data, option=orjson.OPT_INDENT_2)
+        filename = f"{basename}.json"
+    else:
+        findings_md = "".join(_iter_findings_md(findings_by_severity, include_ev))
+        
+        report_content = (
+            "# Penetration Test Report\n\n"
+            f"**Target:** {target}\n"
+            f"**Generated:** {timestamp}\n"
+            f"**Scope:** {', '.join(scope) if scope else 'Not defined'}\n\n"
+            "---\n\n"
+            "## Executive Summary\n\n"
+            f"This penetration test assessment identified **{len(findings)}** security findings:\n\n"
+            "| Severity | Count |\n|----------|-------|\n"
+            f"| Critical | {severity_counts.get('critical', 0)} |\n"
+            f"| High | {severity_counts.get('high', 0)} |\n"
+            f"| Medium | {severity_counts.get('medium', 0)} |\n"
+            f"| Low | {severity_counts.get('low', 0)} |\n"
+            f"| Info | {severity_counts.get('info', 0)} |\n\n"
+            "---\n\n"
+            "## Findings\n"
+            f"{findings_md}"
+            "\n---\n\n*Report generated by Burp Suite MCP Server*\n"
+        )
+        report_bytes = report_content.encode("utf-8")
+        filename = f"{basename}.md"
+    
+    report_path = REPORTS_DIR / filename
+    await asyncio.to_thread(report_path.write_bytes, report_bytes)
+    
+    logger.info(f"Report generated: {report_path}")
+    
+    return (
+        "[OK] Report Generated\n\n"
+        f"Format: {format_type.upper()}\n"
+        f"Filename: {filename}\n"
+        f"Path: {report_path}\n\n"
+        "Summary:\n"
+        f"  - Total Findings: {len(findings)}\n"
+        f"  - Critical: {severity_counts.get('critical', 0)}\n"
+        f"  - High: {severity_counts.get('high', 0)}\n"
+        f"  - Medium: {severity_counts.get('medium', 0)}\n"
+        f"  - Low: {severity_counts.get('low', 0)}\n"
+        f"  - Info: {severity_counts.get('info', 0)}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def run_workflow(workflow_name: str = "", target: str = "") -> str:
     """Run a predefined testing workflow."""
     target_url = target.strip() or session_data.get("target", "")
     if not target_url:
         return "[ERROR] No target specified. Use set_target first."
     
-    try:
-        workflows = {
-            "quick_scan": {
-                "name": "Quick Security Scan",
-                "steps": [
-                    "1. Technology fingerprinting",
-                    "2. Port and service detection",
-                    "3. Common vulnerability checks",
-                    "4. Security header analysis",
-                    "5. SSL/TLS configuration review"
-                ],
-                "duration": "15-30 minutes"
-            },
-            "owasp_top10": {
-                "name": "OWASP Top 10 Assessment",
-                "steps": [
-                    "1. A01 - Broken Access Control testing",
-                    "2. A02 - Cryptographic failures check",
-                    "3. A03 - Injection testing (SQL, Command, etc.)",
-                    "4. A04 - Insecure design review",
-                    "5. A05 - Security misconfiguration",
-                    "6. A06 - Vulnerable components scan",
-                    "7. A07 - Authentication testing",
-                    "8. A08 - Software integrity verification",
-                    "9. A09 - Logging and monitoring check",
-                    "10. A10 - SSRF testing"
-                ],
-                "duration": "2-4 hours"
-            },
-            "api_security": {
-                "name": "API Security Assessment",
-                "steps": [
-                    "1. API endpoint discovery",
-                    "2. Authentication mechanism analysis",
-                    "3. Authorization testing (BOLA/IDOR)",
-                    "4. Rate limiting verification",
-                    "5. Input validation testing",
-                    "6. Data exposure analysis",
-                    "7. Error handling review"
-                ],
-                "duration": "1-2 hours"
-            },
-            "authentication": {
-                "name": "Authentication Security Review",
-                "steps": [
-                    "1. Login mechanism analysis",
-                    "2. Password policy verification",
-                    "3. Session management testing",
-                    "4. Multi-factor authentication review",
-                    "5. Account lockout testing",
-                    "6. Password reset flow analysis",
-                    "7. Remember me functionality"
-                ],
-                "duration": "1-2 hours"
-            }
-        }
-        
-        if workflow_name not in workflows:
-            available = "\n".join([f"  - {k}: {v['name']}" for k, v in workflows.items()])
-            return f"[LIST] Available Workflows\n\n{available}\n\nUsage: run_workflow('workflow_name', 'target_url')"
-        
-        workflow = workflows[workflow_name]
-        steps_list = "\n".join([f"  {s}" for s in workflow["steps"]])
-        
-        session_data["current_workflow"] = {
-            "name": workflow_name,
-            "target": target_url,
-            "started": datetime.now(timezone.utc).isoformat(),
-            "current_step": 0
-        }
-        
-        result = f"[START] Workflow Started: {workflow['name']}\n\n"
-        result += f"Target: {target_url}\n"
-        result += f"Estimated Duration: {workflow['duration']}\n\n"
-        result += f"Steps:\n{steps_list}\n\n"
-        result += "Instructions:\n"
-        result += "I will guide you through each step. For each step:\n"
-        result += "1. I will explain what to test\n"
-        result += "2. Provide specific payloads/techniques\n"
-        result += "3. Help you record findings\n\n"
-        result += "Ready to begin? Say 'next' to start Step 1.\n\n"
-        result += "[WARNING] Ensure you have written authorization before testing."
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    if workflow_name not in WORKFLOWS:
+        return f"[LIST] Available Workflows\n\n{WORKFLOWS_LISTING}\n\nUsage: run_workflow('workflow_name', 'target_url')"
+    
+    workflow = WORKFLOWS[workflow_name]
+    steps_list = WORKFLOW_STEPS_RENDERED[workflow_name]
+    
+    session_data["current_workflow"] = {
+        "name": workflow_name,
+        "target": target_url,
+        "started": _now_iso(),
+        "current_step": 0
+    }
+    
+    return (
+        f"[START] Workflow Started: {workflow['name']}\n\n"
+        f"Target: {target_url}\n"
+        f"Estimated Duration: {workflow['duration']}\n\n"
+        f"Steps:\n{steps_list}\n\n"
+        "Instructions:\n"
+        "I will guide you through each step. For each step:\n"
+        "1. I will explain what to test\n"
+        "2. Provide specific payloads/techniques\n"
+        "3. Help you record findings\n\n"
+        "Ready to begin? Say 'next' to start Step 1.\n\n"
+        "[WARNING] Ensure you have written authorization before testing."
+    )
 
 @mcp.tool()
+@safe_tool
 async def encode_payload(payload: str = "", encoding: str = "url") -> str:
     """Encode a payload for testing."""
     if not payload.strip():
         return "[ERROR] Payload is required"
     
-    try:
-        import base64
-        import urllib.parse
-        import html
-        
-        results = {}
-        
-        if encoding == "all" or encoding == "url":
-            results["URL Encoded"] = urllib.parse.quote(payload)
-            results["Double URL"] = urllib.parse.quote(urllib.parse.quote(payload))
-        
-        if encoding == "all" or encoding == "base64":
-            results["Base64"] = base64.b64encode(payload.encode()).decode()
-        
-        if encoding == "all" or encoding == "html":
-            results["HTML Entities"] = html.escape(payload)
-            results["HTML Numeric"] = "".join([f"&#{ord(c)};" for c in payload])
-        
-        if encoding == "all" or encoding == "hex":
-            results["Hex"] = payload.encode().hex()
-        
-        result = f"[ENCODE] Payload Encoding\n\nOriginal: {payload}\n\nEncoded Versions:\n"
-        for name, encoded in results.items():
-            result += f"\n{name}:\n{encoded}\n"
-        
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    # Each encoding is written out as soon as it is produced so only one is alive at a time.
+    buf = io.StringIO()
+    buf.write("[ENCODE] Payload Encoding\n\nOriginal: ")
+    buf.write(payload)
+    buf.write("\n\nEncoded Versions:\n")
+    
+    def write_section(name, encoded):
+        buf.write(f"\n{name}:\n")
+        buf.write(encoded)
+        buf.write("\n")
+    
+    if encoding == "all" or encoding == "url":
+        url_once = urllib.parse.quote(payload)
+        write_section("URL Encoded", url_once)
+        write_section("Double URL", urllib.parse.quote(url_once) if url_once != payload else url_once)
+    
+    if encoding == "all" or encoding == "base64":
+        write_section("Base64", binascii.b2a_base64(payload.encode(), newline=False).decode("ascii"))
+    
+    if encoding == "all" or encoding == "html":
+        write_section("HTML Entities", html.escape(payload))
+        write_section("HTML Numeric", payload.translate(HTML_NUMERIC_TABLE))
+    
+    if encoding == "all" or encoding == "hex":
+        write_section("Hex", payload.encode().hex())
+    
+    return buf.getvalue()
 
 @mcp.tool()
+@safe_tool(error_prefix="Decoding error")
 async def decode_payload(payload: str = "", encoding: str = "url") -> str:
     """Decode an encoded payload."""
     if not payload.strip():
         return "[ERROR] Payload is required"
     
-    try:
-        import base64
-        import urllib.parse
-        
-        decoded = ""
-        
-        if encoding == "url":
-            decoded = urllib.parse.unquote(payload)
-        elif encoding == "base64":
-            decoded = base64.b64decode(payload).decode()
-        elif encoding == "hex":
-            decoded = bytes.fromhex(payload.replace("\\x", "").replace("0x", "")).decode()
-        else:
-            return f"[ERROR] Unknown encoding: {encoding}. Use: url, base64, hex"
-        
-        result = f"[DECODE] Payload Decoded\n\n"
-        result += f"Encoded ({encoding}):\n{payload}\n\n"
-        result += f"Decoded:\n{decoded}"
-        return result
-    except Exception as e:
-        return f"[ERROR] Decoding error: {str(e)}"
+    decoded = ""
+    
+    if encoding == "url":
+        decoded = urllib.parse.unquote(payload)
+    elif encoding == "base64":
+        decoded = base64.b64decode(payload).decode()
+    elif encoding == "hex":
+        decoded = bytes.fromhex(HEX_PREFIX_RE.sub("", payload)).decode()
+    else:
+        return f"[ERROR] Unknown encoding: {encoding}. Use: url, base64, hex"
+    
+    return (
+        "[DECODE] Payload Decoded\n\n"
+        f"Encoded ({encoding}):\n{payload}\n\n"
+        f"Decoded:\n{decoded}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def analyze_response(response_body: str = "", check_type: str = "all") -> str:
     """Analyze an HTTP response for security issues."""
     if not response_body.strip():
         return "[ERROR] Response body is required"
     
-    try:
-        issues = []
-        info = []
-        
-        security_patterns = {
-            "SQL Error": ["mysql", "sqlite", "postgresql", "ora-", "sql syntax", "sqlstate"],
-            "Path Disclosure": ["/var/www", "/home/", "c:\\", "\\users\\", "/usr/"],
-            "Stack Trace": ["traceback", "exception", "error at line", "stack trace"],
-            "Debug Info": ["debug", "phpinfo", "server_software", "x-powered-by"],
-            "Sensitive Data": ["password", "secret", "api_key", "token", "bearer"],
-            "Version Disclosure": ["version", "powered by", "server:", "x-aspnet-version"]
-        }
-        
-        response_lower = response_body.lower()
-        
-        for issue_type, patterns in security_patterns.items():
-            for pattern in patterns:
-                if pattern in response_lower:
-                    issues.append(f"[WARNING] {issue_type}: Found '{pattern}'")
-                    break
-        
-        info.append(f"[SIZE] Response Length: {len(response_body)} bytes")
-        
-        if "<form" in response_lower:
-            form_count = response_lower.count("<form")
-            info.append(f"[NOTE] Forms Found: {form_count}")
-        
-        if "<script" in response_lower:
-            script_count = response_lower.count("<script")
-            info.append(f"[SCRIPT] Scripts Found: {script_count}")
-        
-        issues_text = "\n".join(issues) if issues else "No obvious security issues detected."
-        info_text = "\n".join(info)
-        
-        result = "[SEARCH] Response Analysis\n\n"
-        result += f"Security Issues:\n{issues_text}\n\n"
-        result += f"Information:\n{info_text}"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    hits = {}
+    tag_counts = dict.fromkeys(COUNTED_TAGS, 0)
+    for pattern in iter_response_patterns(response_body):
+        if pattern in tag_counts:
+            tag_counts[pattern] += 1
+            continue
+        issue_type = PATTERN_TO_ISSUE.get(pattern)
+        if issue_type is not None and issue_type not in hits:
+            hits[issue_type] = pattern
+    issues = [f"[WARNING] {issue_type}: Found '{hits[issue_type]}'" for issue_type in SECURITY_PATTERNS if issue_type in hits]
+    
+    form_count = tag_counts["<form"]
+    script_count = tag_counts["<script"]
+    forms_line = f"\n[NOTE] Forms Found: {form_count}" if form_count else ""
+    scripts_line = f"\n[SCRIPT] Scripts Found: {script_count}" if script_count else ""
+    
+    issues_text = "\n".join(issues) if issues else "No obvious security issues detected."
+    
+    return (
+        "[SEARCH] Response Analysis\n\n"
+        f"Security Issues:\n{issues_text}\n\n"
+        f"Information:\n[SIZE] Response Length: {len(response_body)} bytes"
+        f"{forms_line}{scripts_line}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def get_session_status() -> str:
     """Get the current testing session status and statistics."""
-    try:
-        target = session_data.get("target", "Not set")
-        scope_count = len(session_data.get("scope", []))
-        findings_count = len(session_data.get("findings", []))
-        scan_count = len(session_data.get("scan_history", []))
-        current_workflow = session_data.get("current_workflow")
-        
-        findings = session_data.get("findings", [])
-        severity_counts = {}
-        for f in findings:
-            sev = f["severity"]
-            severity_counts[sev] = severity_counts.get(sev, 0) + 1
-        
-        workflow_status = "None active"
-        if current_workflow:
-            workflow_status = f"{current_workflow['name']} (Step {current_workflow['current_step']})"
-        
-        result = "[STATS] Session Status\n\n"
-        result += f"Target: {target}\n"
-        result += f"Scope Items: {scope_count}\n"
-        result += f"Current Workflow: {workflow_status}\n\n"
-        result += f"Findings Summary:\n"
-        result += f"  - Total: {findings_count}\n"
-        result += f"  - Critical: {severity_counts.get('critical', 0)}\n"
-        result += f"  - High: {severity_counts.get('high', 0)}\n"
-        result += f"  - Medium: {severity_counts.get('medium', 0)}\n"
-        result += f"  - Low: {severity_counts.get('low', 0)}\n"
-        result += f"  - Info: {severity_counts.get('info', 0)}\n\n"
-        result += f"Scan History: {scan_count} scans completed\n\n"
-        result += f"Burp Connection:\n"
-        result += f"  - Proxy: {get_burp_proxy_url()}\n"
-        result += f"  - API: {get_burp_api_url()}"
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    target = session_data.get("target", "Not set")
+    scope_count = len(session_data.get("scope", []))
+    findings_count = len(session_data.get("findings", []))
+    scan_count = len(session_data.get("scan_history", []))
+    current_workflow = session_data.get("current_workflow")
+    
+    severity_counts = {sev: len(fs) for sev, fs in session_data["findings_by_severity"].items()}
+    
+    workflow_status = "None active"
+    if current_workflow:
+        workflow_status = f"{current_workflow['name']} (Step {current_workflow['current_step']})"
+    
+    return (
+        "[STATS] Session Status\n\n"
+        f"Target: {target}\n"
+        f"Scope Items: {scope_count}\n"
+        f"Current Workflow: {workflow_status}\n\n"
+        "Findings Summary:\n"
+        f"  - Total: {findings_count}\n"
+        f"  - Critical: {severity_counts.get('critical', 0)}\n"
+        f"  - High: {severity_counts.get('high', 0)}\n"
+        f"  - Medium: {severity_counts.get('medium', 0)}\n"
+        f"  - Low: {severity_counts.get('low', 0)}\n"
+        f"  - Info: {severity_counts.get('info', 0)}\n\n"
+        f"Scan History: {scan_count} scans completed\n\n"
+        "Burp Connection:\n"
+        f"  - Proxy: {BURP_PROXY_URL}\n"
+        f"  - API: {BURP_API_URL}"
+    )
 
 @mcp.tool()
+@safe_tool
 async def clear_session() -> str:
     """Clear all session data including findings and scan history."""
-    try:
-        findings_count = len(session_data["findings"])
-        
-        session_data["target"] = ""
-        session_data["scope"] = []
-        session_data["findings"] = []
-        session_data["scan_history"] = []
-        session_data["current_workflow"] = None
-        
-        logger.info("Session cleared")
-        
-        result = "[CLEAR] Session Cleared\n\n"
-        result += f"Removed:\n"
-        result += f"  - Target configuration\n"
-        result += f"  - {findings_count} findings\n"
-        result += f"  - Scan history\n"
-        result += f"  - Active workflow\n\n"
-        result += "The session is now reset. Use set_target to begin a new assessment."
-        return result
-    except Exception as e:
-        return f"[ERROR] {str(e)}"
+    findings_count = len(session_data["findings"])
+    
+    session_data["target"] = ""
+    session_data["scope"] = []
+    session_data["scope_set"] = set()
+    session_data["scope_rendered"] = ""
+    session_data["findings"] = []
+    session_data["findings_by_id"] = {}
+    session_data["findings_by_severity"] = {sev: [] for sev in SEVERITY_ORDER}
+    session_data["scan_history"] = deque(maxlen=MAX_SCAN_HISTORY)
+    session_data["scan_history_by_id"] = {}
+    session_data["current_workflow"] = None
+    
+    logger.info("Session cleared")
+    
+    return (
+        "[CLEAR] Session Cleared\n\n"
+        "Removed:\n"
+        "  - Target configuration\n"
+        f"  - {findings_count} findings\n"
+        "  - Scan history\n"
+        "  - Active workflow\n\n"
+        "The session is now reset. Use set_target to begin a new assessment."
+    )
 
 if __name__ == "__main__":
     logger.info("Starting Burp Suite MCP Server...")
     logger.info(f"Burp Proxy: {get_burp_proxy_url()}")
     logger.info(f"Burp API: {get_burp_api_url()}")
     
+    if sys.platform != "win32":
+        try:
+            import uvloop
+            asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            logger.info("Using uvloop event loop")
+        except ImportError:
+            logger.info("uvloop not installed, using default asyncio event loop")
+    
     try:
         mcp.run(transport='stdio')
     except Exception as e:
@@ -2,16 +2,37 @@
 """CyberRAG MCP Server - Cybersecurity Knowledge Base Aggregator"""
 import os
 import sys
-import json
+import asyncio
+import atexit
 import logging
 import hashlib
 import sqlite3
 import re
+import functools
+import itertools
+import multiprocessing
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
 
+import orjson
+import yaml
 from mcp.server.fastmcp import FastMCP
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
 # Configure logging to stderr (stdout is for MCP communication)
 logging.basicConfig(
     level=logging.INFO,
@@ -26,18 +47,64 @@ SQLITE_PATH = DATA_DIR / "sqlite" / "cyberrag.db"
 CHROMADB_DIR = str(DATA_DIR / "chromadb")
 OBSIDIAN_DIR = DATA_DIR / "obsidian_export"
 EXPORTS_DIR = DATA_DIR / "exports"
+HTTP_CACHE_DIR = DATA_DIR / "http_cache"
 
 # Ensure directories exist
-for d in [DATA_DIR / "sqlite", DATA_DIR / "chromadb", OBSIDIAN_DIR, EXPORTS_DIR]:
+for d in [DATA_DIR / "sqlite", DATA_DIR / "chromadb", OBSIDIAN_DIR, EXPORTS_DIR, HTTP_CACHE_DIR]:
     d.mkdir(parents=True, exist_ok=True)
 
+FETCH_CONCURRENCY = 16
+EXPORT_WRITE_CONCURRENCY = 16
+H1_API_CONCURRENCY = 4
+# Least recently used HTTP cache bodies are evicted past HTTP_CACHE_MAX_BYTES
+HTTP_CACHE_MAX_BYTES = 256 * 1024 * 1024
+HTTP_CACHE_TMP_TTL = 3600
+
+VRT_PRIORITY_LABELS = {
+    1: "Critical (P1)", 2: "High (P2)", 3: "Medium (P3)",
+    4: "Low (P4)", 5: "Informational (P5)"
+}
+VRT_BASE_TAGS = ("bugcrowd", "vrt", "taxonomy", "severity-rating")
+MAX_FETCH_BYTES = 2 * 1024 * 1024
+
+# Stored content is capped at MAX_CONTENT_CHARS (SQLite) and MAX_EMBED_CHARS (ChromaDB)
+MAX_CONTENT_CHARS = 15000
+MAX_EMBED_CHARS = 8000
+MAX_RAW_CONTENT_CHARS = 2 * MAX_CONTENT_CHARS
+EXPORT_WRITE_BUFFER = 1 << 20
+
 # === MCP SERVER ===
-mcp = FastMCP("CyberRAG")
+_http_client = None
+_cpu_pool = None
+
+@asynccontextmanager
+async def server_lifespan(server):
+    try:
+        yield {}
+    finally:
+        await close_http_client()
+        shutdown_cpu_pool()
+        close_db()
+
+mcp = FastMCP("CyberRAG", lifespan=server_lifespan)
 
 # === SQLITE SETUP ===
-def get_db():
-    conn = sqlite3.connect(str(SQLITE_PATH))
-    conn.row_factory = sqlite3.Row
+SQLITE_PRAGMAS = (
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    "cache_size=-65536",
+    "mmap_size=268435456",
+    "busy_timeout=30000",
+)
+# One cached connection per thread; writes are serialized through _db_write_lock
+_db_local = threading.local()
+_db_write_lock = threading.Lock()
+_db_connections = []
+_db_schema_ready = False
+# Bumped by close_db so threads drop connections it has already closed
+_db_generation = 0
+
+def init_schema(conn):
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("""CREATE TABLE IF NOT EXISTS knowledge (
         id TEXT PRIMARY KEY,
@@ -59,9 +126,96 @@ def get_db():
         item_count INTEGER DEFAULT 0,
         status TEXT DEFAULT 'ready'
     )""")
+    # (source, category, subcategory) also serves source-only lookups such as refresh_source's delete
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_src_cat ON knowledge(source, category, subcategory)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_mitre ON knowledge(mitre_id)")
+    # Normalized copy of knowledge.tags so tag lookups are index searches instead of LIKE scans
+    conn.execute("""CREATE TABLE IF NOT EXISTS knowledge_tags (
+        item_id TEXT NOT NULL,
+        tag TEXT NOT NULL,
+        PRIMARY KEY (tag, item_id)
+    ) WITHOUT ROWID""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_tags_item ON knowledge_tags(item_id)")
+    # Backfill databases created before the tags table existed
+    conn.execute("""INSERT OR IGNORE INTO knowledge_tags (item_id, tag)
+        SELECT k.id, j.value FROM knowledge k, json_each(k.tags) j
+        WHERE NOT EXISTS (SELECT 1 FROM knowledge_tags)""")
     conn.commit()
+
+def get_db():
+    global _db_schema_ready
+    conn = getattr(_db_local, "conn", None)
+    if conn is None or _db_local.generation != _db_generation:
+        # Each connection is only used by its own thread; the check is relaxed so close_db can run from the shutdown hook
+        conn = sqlite3.connect(str(SQLITE_PATH), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        _db_local.conn = conn
+        _db_local.generation = _db_generation
+        _db_connections.append(conn)
+    if not _db_schema_ready:
+        with _db_write_lock:
+            if not _db_schema_ready:
+                init_schema(conn)
+                _db_schema_ready = True
     return conn
 
+def close_db():
+    global _db_generation
+    _db_generation += 1
+    while _db_connections:
+        _db_connections.pop().close()
+
+atexit.register(close_db)
+
+EXPORT_FETCH_SIZE = 1000
+# Fixed column order for the export queries, so rows can be unpacked positionally
+EXPORT_COLUMNS = "id, title, content, source, category, subcategory, tags, mitre_id, url, updated_at"
+
+def stream_rows(cursor, size=EXPORT_FETCH_SIZE):
+    """Iterate a query's rows lazily in fetchmany batches, or return None when it matched nothing."""
+    cursor.arraysize = size
+    first = cursor.fetchmany()
+    if not first:
+        return None
+    return itertools.chain(first, itertools.chain.from_iterable(iter(cursor.fetchmany, [])))
+
+_bulk_depth = 0
+
+@contextmanager
+def bulk_mode():
+    """Trade durability for write speed (synchronous=OFF, exclusive lock, no cache spill) while a bulk ingestion runs."""
+    global _bulk_depth
+    conn = get_db()
+    with _db_write_lock:
+        if _bulk_depth == 0:
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+            conn.execute("PRAGMA cache_spill=OFF")
+        _bulk_depth += 1
+    try:
+        yield conn
+    finally:
+        with _db_write_lock:
+            _bulk_depth -= 1
+            if _bulk_depth == 0:
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute("PRAGMA locking_mode=NORMAL")
+                conn.execute("PRAGMA cache_spill=ON")
+                # The exclusive lock is only released on the next access
+                conn.execute("SELECT 1 FROM sources LIMIT 1").fetchall()
+
+def bulk_ingest(fn):
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            with bulk_mode():
+                return await fn(*args, **kwargs)
+        finally:
+            prune_http_cache()
+    return wrapper
+
 # === CHROMADB SETUP ===
 _collection = None
 
@@ -82,98 +236,550 @@ def get_collection():
     return _collection
 
 # === HELPER FUNCTIONS ===
+# Pending writes, flushed together every SQLITE_BATCH_SIZE items so rows whose stored
+# copy is unchanged can be skipped in both stores; ChromaDB upserts go in CHROMA_BATCH_SIZE chunks
+SQLITE_BATCH_SIZE = 500
+CHROMA_BATCH_SIZE = 200
+SQLITE_MAX_PARAMS = 900
+INSERT_KNOWLEDGE_SQL = """INSERT OR REPLACE INTO knowledge
+    (id, title, content, source, category, subcategory, tags, mitre_id, url, content_hash, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+DELETE_TAGS_SQL = "DELETE FROM knowledge_tags WHERE item_id=?"
+INSERT_TAGS_SQL = "INSERT OR IGNORE INTO knowledge_tags (item_id, tag) SELECT ?, value FROM json_each(?)"
+UPSERT_SOURCE_SQL = """INSERT OR REPLACE INTO sources (name, last_ingested, item_count, status)
+    VALUES (?, ?, ?, 'complete')"""
+_pending_sqlite = []
+_pending_chroma = {}
+# Per-source item counts recorded by update_source, written with the next knowledge flush
+_source_counters = {}
+
+# Precompiled patterns for content cleaning and source parsing
+# HTML tags, image markdown (can't be embedded meaningfully) and navigation boilerplate
+RAG_NOISE_RE = re.compile(
+    r'<[^>]+>'
+    r'|!\[[^\]]*\]\([^)]+\)'
+    r'|(?i:table of contents|back to top|click here to|read more\.\.\.)'
+)
+EXCESS_NEWLINES_RE = re.compile(r'\n{3,}')
+# Unicode whitespace becomes a plain space, zero-width characters are dropped
+RAG_UNICODE_TABLE = str.maketrans(
+    {c: ' ' for c in '\xa0\u200b\u2028\u2029'}
+    | {c: None for c in '\u200c\u200d\u200e\u200f\u2060\ufeff'}
+)
+GTFO_FUNCTIONS_RE = re.compile(r"functions:\s*\n((?:\s+-\s+\w+\n?)+)")
+GTFO_FUNCTION_NAME_RE = re.compile(r"-\s+(\w+)")
+# A "## Section" header or a "- [title](http...)" writeup link, one per line
+WRITEUP_SECTION_OR_LINK_RE = re.compile(
+    r'^[ \t]*(?:## (?P<section>.+)|- \[(?P<title>[^\]]+)\]\((?P<url>http[^)]+)\))', re.MULTILINE)
+H1_TOP_REPORT_RE = re.compile(r'\[([^\]]+)\]\(https://hackerone\.com/reports/(\d+)\)[^-]*-\s*(\d+)\s*upvotes?,\s*\$?([\d,]+)')
+
+# Precompiled patterns for the markdown exports
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+IMAGE_MARKDOWN_RE = re.compile(r'!\[[^\]]*\]\([^)]+\)')
+EXPORT_NOISE_RE = re.compile(r'(table of contents|back to top|click here|read more\.\.\.)', re.IGNORECASE)
+HEADER_SPLIT_RE = re.compile(r'\n(?=#{1,6}\s)')
+HEADER_DEMOTE_RE = re.compile(r'^(#{1,2})\s')
+UNSAFE_FILENAME_RE = re.compile(r'[<>:"/\\|?*]')
+
+@functools.lru_cache(maxsize=65536)
 def content_hash(text):
+    # Item ids are derived from this digest, so it must stay SHA-256 to keep ids stable across releases
     return hashlib.sha256(text.encode()).hexdigest()[:16]
 
+@functools.lru_cache(maxsize=4096)
+def parse_tags(tags_json):
+    """Decode a stored tags column into a tuple; cached because the same rows are read repeatedly."""
+    return tuple(orjson.loads(tags_json)) if tags_json else ()
+
+def content_fingerprint(data):
+    """64-bit BLAKE2b fingerprint of stored content (the knowledge.content_hash column). Accepts str or UTF-8 bytes."""
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
 def clean_for_rag(text):
     """Clean content for optimal RAG embedding quality - removes noise that wastes tokens."""
-    # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
-    # Remove image markdown references (can't be embedded meaningfully)
-    text = re.sub(r'!\[[^\]]*\]\([^)]+\)', '', text)
-    # Remove excessive whitespace
-    text = re.sub(r'\n{3,}', '\n\n', text)
-    # Remove common navigation/boilerplate
-    text = re.sub(r'(?i)(table of contents|back to top|click here to|read more\.\.\.)', '', text)
-    # Normalize unicode whitespace
-    text = re.sub(r'[\xa0\u200b\u2028\u2029]', ' ', text)
-    # Remove zero-width characters
-    text = re.sub(r'[\u200b-\u200f\u2060\ufeff]', '', text)
-    return text.strip()
+    text = RAG_NOISE_RE.sub('', text)
+    text = EXCESS_NEWLINES_RE.sub('\n\n', text)
+    return text.translate(RAG_UNICODE_TABLE).strip()
 
 def store_knowledge(item_id, title, content, source, category="", subcategory="", tags=None, mitre_id="", url=""):
     if tags is None:
         tags = []
-    now = datetime.now(timezone.utc).isoformat()
-    # Clean content for RAG quality before storage
-    content = clean_for_rag(content)
-    c_hash = content_hash(content)
-    truncated = content[:15000]
-
+    # Clean content for RAG quality before storage; only the head can survive truncation,
+    # so leave headroom for what cleaning strips and skip the rest
+    content = clean_for_rag(content[:MAX_RAW_CONTENT_CHARS])
+    c_hash = content_fingerprint(content)
+    truncated = content[:MAX_CONTENT_CHARS]
+    # Drop duplicate tags, keeping first-seen order so the stored JSON is stable across runs
+    tags_json = orjson.dumps(list(dict.fromkeys(tags))).decode()
+
+    _pending_sqlite.append(
+        (item_id, title, truncated, source, category, subcategory, tags_json, mitre_id, url, c_hash))
+    _pending_chroma[item_id] = (truncated[:MAX_EMBED_CHARS], {
+        "title": title,
+        "source": source,
+        "category": category,
+        "subcategory": subcategory,
+        "mitre_id": mitre_id,
+        "url": url
+    })
+    if len(_pending_sqlite) >= SQLITE_BATCH_SIZE:
+        flush_knowledge()
+
+def store_knowledge_bulk(items):
+    """Store a batch of store_knowledge keyword dicts and write them out in one transaction and one ChromaDB upsert."""
+    for item in items:
+        store_knowledge(**item)
+    flush_knowledge()
+
+def unchanged_ids(conn, rows):
+    """Ids of rows whose stored copy already has the same content fingerprint and metadata."""
+    stored = {}
+    ids = [row[0] for row in rows]
+    for start in range(0, len(ids), SQLITE_MAX_PARAMS):
+        chunk = ids[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(
+                f"SELECT id, title, source, category, subcategory, tags, mitre_id, url, content_hash "
+                f"FROM knowledge WHERE id IN ({placeholders})", chunk):
+            stored[row[0]] = tuple(row[1:])
+    return {row[0] for row in rows if stored.get(row[0]) == (row[1], *row[3:10])}
+
+def store_knowledge_many(rows, now=None, source_counts=None):
+    """Insert or replace changed knowledge rows with one executemany inside a single transaction. Returns the ids skipped as unchanged.
+
+    Rows hold every column but the timestamps; the whole batch is stamped with one `now`.
+    `source_counts` ({source name: item count}) are upserted into sources in the same transaction.
+    """
+    if not rows and not source_counts:
+        return set()
+    if now is None:
+        now = datetime.now(timezone.utc).isoformat()
     conn = get_db()
-    try:
-        conn.execute("""INSERT OR REPLACE INTO knowledge
-            (id, title, content, source, category, subcategory, tags, mitre_id, url, content_hash, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-            (item_id, title, truncated, source, category, subcategory, json.dumps(tags), mitre_id, url, c_hash, now, now))
-        conn.commit()
-    finally:
-        conn.close()
-
+    with _db_write_lock, conn:
+        unchanged = unchanged_ids(conn, rows)
+        changed = [row for row in rows if row[0] not in unchanged]
+        conn.executemany(INSERT_KNOWLEDGE_SQL, ((*row, now, now) for row in changed))
+        conn.executemany(DELETE_TAGS_SQL, ((row[0],) for row in changed))
+        conn.executemany(INSERT_TAGS_SQL, ((row[0], row[6]) for row in changed))
+        if source_counts:
+            conn.executemany(UPSERT_SOURCE_SQL, ((name, now, count) for name, count in source_counts.items()))
+    return unchanged
+
+def _flush_chroma(pending, unchanged, batch_size=CHROMA_BATCH_SIZE):
+    if not pending:
+        return
     collection = get_collection()
-    if collection:
+    if not collection:
+        return
+    if unchanged:
+        # Only skip documents ChromaDB actually holds, so a store that missed a write still catches up
+        try:
+            indexed = set(collection.get(ids=list(unchanged), include=[])["ids"])
+            for item_id in indexed:
+                pending.pop(item_id, None)
+        except Exception as e:
+            logger.warning(f"ChromaDB lookup error: {e}")
+    pending = list(pending.items())
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
         try:
             collection.upsert(
-                ids=[item_id],
-                documents=[truncated[:8000]],
-                metadatas=[{
-                    "title": title,
-                    "source": source,
-                    "category": category,
-                    "subcategory": subcategory,
-                    "mitre_id": mitre_id,
-                    "url": url
-                }]
+                ids=[item_id for item_id, _ in batch],
+                documents=[doc for _, (doc, _) in batch],
+                metadatas=[meta for _, (_, meta) in batch]
             )
         except Exception as e:
             logger.error(f"ChromaDB upsert error: {e}")
 
+def flush_knowledge(batch_size=CHROMA_BATCH_SIZE):
+    """Write buffered knowledge rows to SQLite and upsert buffered documents to ChromaDB, skipping unchanged items."""
+    rows = list(_pending_sqlite)
+    pending = dict(_pending_chroma)
+    source_counts = dict(_source_counters)
+    _pending_sqlite.clear()
+    _pending_chroma.clear()
+    _source_counters.clear()
+    unchanged = set()
+    try:
+        unchanged = store_knowledge_many(rows, source_counts=source_counts)
+    finally:
+        _flush_chroma(pending, unchanged, batch_size)
+
 def update_source(name, count):
-    now = datetime.now(timezone.utc).isoformat()
-    conn = get_db()
+    """Record a source's item count; it is written in the same transaction as the final knowledge flush."""
+    _source_counters[name] = count
+
+# === PARSING (CPU-bound, runs in the process pool) ===
+# libyaml-backed loader when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+VULN_TYPES = {
+    "xss": ["xss", "cross-site scripting", "script injection"],
+    "sqli": ["sql injection", "sqli", "sql query"],
+    "ssrf": ["ssrf", "server-side request forgery"],
+    "idor": ["idor", "insecure direct object"],
+    "rce": ["rce", "remote code execution", "command injection"],
+    "csrf": ["csrf", "cross-site request forgery"],
+    "lfi": ["lfi", "local file inclusion", "path traversal", "directory traversal"],
+    "xxe": ["xxe", "xml external entity"],
+    "open-redirect": ["open redirect", "url redirect"],
+    "info-disclosure": ["information disclosure", "sensitive data", "data exposure"],
+    "auth-bypass": ["authentication bypass", "authorization bypass", "access control"],
+    "subdomain-takeover": ["subdomain takeover"],
+    "dos": ["denial of service", "dos", "redos"],
+    "race-condition": ["race condition", "toctou"],
+    "deserialization": ["deserialization", "insecure deserialization"],
+    "ssti": ["template injection", "ssti"],
+    "graphql": ["graphql"],
+    "cors": ["cors", "cross-origin"],
+    "upload": ["file upload", "unrestricted upload"],
+    "prototype-pollution": ["prototype pollution"]
+}
+
+# One Aho-Corasick pass over the report when pyahocorasick is installed, otherwise a substring test per keyword
+if ahocorasick is not None:
+    VULN_AUTOMATON = ahocorasick.Automaton()
+    for vuln_tag, keywords in VULN_TYPES.items():
+        for kw in keywords:
+            VULN_AUTOMATON.add_word(kw, vuln_tag)
+    VULN_AUTOMATON.make_automaton()
+else:
+    VULN_AUTOMATON = None
+
+def parse_wadcoms_frontmatter(content):
+    """Extract description, command and list fields from a WADComs page's YAML frontmatter."""
+    fields = {"description": "", "command": "", "items": [], "services": [], "OS": [], "attack_type": []}
+    if not content.startswith("---"):
+        return fields
+    parts = content.split("---", 2)
+    if len(parts) < 3:
+        return fields
     try:
-        conn.execute("""INSERT OR REPLACE INTO sources (name, last_ingested, item_count, status)
-            VALUES (?, ?, ?, 'complete')""", (name, now, count))
-        conn.commit()
+        frontmatter = yaml.load(parts[1], Loader=YAML_LOADER)
+    except yaml.YAMLError:
+        return fields
+    if not isinstance(frontmatter, dict):
+        return fields
+    for field in ("description", "command"):
+        value = frontmatter.get(field)
+        if value:
+            fields[field] = str(value).strip()
+    for field in ("items", "services", "OS", "attack_type"):
+        value = frontmatter.get(field)
+        if isinstance(value, list):
+            fields[field] = [str(v) for v in value if v is not None]
+        elif value:
+            fields[field] = [str(value)]
+    return fields
+
+def parse_writeup_sections(content):
+    """Group the Awesome-Bugbounty-Writeups README links by their ## section."""
+    current_section = "general"
+    section_items = {}
+    for match in WRITEUP_SECTION_OR_LINK_RE.finditer(content):
+        section = match.group("section")
+        if section is not None:
+            current_section = section.strip()
+            section_items.setdefault(current_section, [])
+        else:
+            section_items.setdefault(current_section, []).append((match.group("title"), match.group("url")))
+    return section_items
+
+def detect_vuln_types(content):
+    """Return the VULN_TYPES tags mentioned in a report and the first one as its category."""
+    content_lower = content.lower()
+    if VULN_AUTOMATON is not None:
+        found = set()
+        for _, vuln_tag in VULN_AUTOMATON.iter(content_lower):
+            found.add(vuln_tag)
+            if len(found) == len(VULN_TYPES):
+                break
+        tags = [vuln_tag for vuln_tag in VULN_TYPES if vuln_tag in found]
+    else:
+        tags = [vuln_tag for vuln_tag, keywords in VULN_TYPES.items()
+                if any(kw in content_lower for kw in keywords)]
+    return tags, tags[0] if tags else "general"
+
+def get_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        try:
+            _cpu_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable, parsing inline: {e}")
+            _cpu_pool = False
+    return _cpu_pool or None
+
+def shutdown_cpu_pool():
+    global _cpu_pool
+    if _cpu_pool:
+        _cpu_pool.shutdown(cancel_futures=True)
+    _cpu_pool = None
+
+def _call_capturing(fn, arg):
+    try:
+        return fn(arg)
+    except Exception as e:
+        return e
+
+async def run_cpu(fn, arg):
+    pool = get_cpu_pool()
+    if pool is None:
+        return fn(arg)
+    return await asyncio.get_running_loop().run_in_executor(pool, fn, arg)
+
+async def map_cpu(fn, items, chunksize=16):
+    """Apply fn to items in the process pool. Exceptions (including failed fetches passed in as items) are returned in place."""
+    work = [item for item in items if not isinstance(item, Exception)]
+    pool = get_cpu_pool()
+    call = functools.partial(_call_capturing, fn)
+    if pool is None or not work:
+        results = iter([call(item) for item in work])
+    else:
+        results = iter(await asyncio.to_thread(lambda: list(pool.map(call, work, chunksize=chunksize))))
+    return [item if isinstance(item, Exception) else next(results) for item in items]
+
+def get_http_client():
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        import httpx
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            headers={"User-Agent": "CyberRAG"}
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# On-disk HTTP cache: each URL keeps its last body plus the ETag/Last-Modified it was served with,
+# so re-ingests revalidate with a conditional GET and rebuild from disk on 304
+def http_cache_paths(url):
+    key = hashlib.blake2b(url.encode(), digest_size=16).hexdigest()
+    return HTTP_CACHE_DIR / f"{key}.json", HTTP_CACHE_DIR / f"{key}.body"
+
+def http_cache_entry(url):
+    """Cached validators for url ({"etag", "last_modified", "encoding"}), or None when there is no complete entry."""
+    meta_path, body_path = http_cache_paths(url)
+    try:
+        meta = orjson.loads(meta_path.read_bytes())
+    except (OSError, orjson.JSONDecodeError):
+        return None
+    return meta if body_path.exists() else None
+
+def conditional_headers(entry):
+    headers = {}
+    if entry:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+    return headers
+
+def http_cache_tmp():
+    """A uniquely named temp file in the cache directory, so concurrent fetches of one URL never share a body."""
+    return tempfile.NamedTemporaryFile(dir=HTTP_CACHE_DIR, suffix=".tmp", delete=False)
+
+def commit_http_cache(url, resp, tmp_body):
+    """Move a fully written body into the cache for url and record the validators resp carried."""
+    meta_path, body_path = http_cache_paths(url)
+    meta_path.unlink(missing_ok=True)
+    os.replace(tmp_body, body_path)
+    meta_path.write_bytes(orjson.dumps({
+        "url": url,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "encoding": resp.encoding
+    }))
+
+def drop_http_cache(url, reason):
+    logger.warning(f"Dropping HTTP cache entry for {url}: {reason}")
+    for path in http_cache_paths(url):
+        path.unlink(missing_ok=True)
+
+def read_http_cache(url):
+    """Cached body for url, marking the entry as recently used."""
+    body_path = http_cache_paths(url)[1]
+    body = body_path.read_bytes()
+    os.utime(body_path)
+    return body
+
+def prune_http_cache():
+    """Evict least recently used entries past HTTP_CACHE_MAX_BYTES and temp files abandoned by a crash."""
+    try:
+        now = time.time()
+        for tmp in HTTP_CACHE_DIR.glob("*.tmp"):
+            if now - tmp.stat().st_mtime > HTTP_CACHE_TMP_TTL:
+                tmp.unlink(missing_ok=True)
+        bodies = [(path.stat(), path) for path in HTTP_CACHE_DIR.glob("*.body")]
+        total = sum(stat.st_size for stat, _ in bodies)
+        for stat, path in sorted(bodies, key=lambda b: b[0].st_mtime):
+            if total <= HTTP_CACHE_MAX_BYTES:
+                break
+            path.with_suffix(".json").unlink(missing_ok=True)
+            path.unlink(missing_ok=True)
+            total -= stat.st_size
+    except OSError as e:
+        logger.warning(f"HTTP cache prune failed: {e}")
+
+def save_http_cache(url, resp, body):
+    if not (resp.headers.get("ETag") or resp.headers.get("Last-Modified")):
+        return
+    tmp_body = None
+    try:
+        with http_cache_tmp() as f:
+            tmp_body = Path(f.name)
+            f.write(body)
+        commit_http_cache(url, resp, tmp_body)
+    except OSError as e:
+        logger.warning(f"HTTP cache write failed for {url}: {e}")
+    finally:
+        if tmp_body:
+            tmp_body.unlink(missing_ok=True)
+
+async def caching_chunks(url, resp):
+    """Pass resp's body chunks through while saving them to the cache; the entry is committed once the body is read in full."""
+    if not (resp.headers.get("ETag") or resp.headers.get("Last-Modified")):
+        async for chunk in resp.aiter_bytes():
+            yield chunk
+        return
+    f = http_cache_tmp()
+    tmp_body = Path(f.name)
+    try:
+        with f:
+            async for chunk in resp.aiter_bytes():
+                f.write(chunk)
+                yield chunk
+        try:
+            commit_http_cache(url, resp, tmp_body)
+        except OSError as e:
+            logger.warning(f"HTTP cache write failed for {url}: {e}")
     finally:
-        conn.close()
+        tmp_body.unlink(missing_ok=True)
+
+async def cached_chunks(url, size=1 << 16):
+    body_path = http_cache_paths(url)[1]
+    with open(body_path, "rb") as f:
+        os.utime(body_path)
+        while chunk := f.read(size):
+            yield chunk
 
 async def fetch_json(url):
-    import httpx
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(url)
-        resp.raise_for_status()
-        return resp.json()
+    # Revalidated against the on-disk cache; GitHub API 304s don't count against the rate limit
+    entry = http_cache_entry(url)
+    resp = await get_http_client().get(url, headers=conditional_headers(entry))
+    if resp.status_code == 304 and entry:
+        try:
+            return orjson.loads(read_http_cache(url))
+        except (OSError, orjson.JSONDecodeError) as e:
+            # Without the entry the retry is unconditional, so it can't be answered with another 304
+            drop_http_cache(url, e)
+            return await fetch_json(url)
+    resp.raise_for_status()
+    save_http_cache(url, resp, resp.content)
+    return orjson.loads(resp.content)
 
 async def fetch_text(url):
-    import httpx
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        resp = await client.get(url)
+    entry = http_cache_entry(url)
+    async with get_http_client().stream("GET", url, headers=conditional_headers(entry)) as resp:
+        if resp.status_code == 304 and entry:
+            try:
+                return read_http_cache(url).decode(entry.get("encoding") or "utf-8", errors="replace")
+            except OSError as e:
+                drop_http_cache(url, e)
+                return await fetch_text(url)
         resp.raise_for_status()
-        return resp.text
+        # Stop reading after MAX_FETCH_BYTES; larger pages are truncated at storage anyway
+        body = bytearray()
+        async for chunk in resp.aiter_bytes():
+            body += chunk
+            if len(body) >= MAX_FETCH_BYTES:
+                break
+        body = bytes(body[:MAX_FETCH_BYTES])
+        save_http_cache(url, resp, body)
+        return body.decode(resp.encoding or "utf-8", errors="replace")
+
+class AsyncByteReader:
+    """Minimal async file-like wrapper so ijson can consume an httpx byte stream."""
+    def __init__(self, chunks):
+        self._chunks = chunks
+
+    async def read(self, size=-1):
+        # ijson probes with read(0) to detect bytes vs str; don't consume a chunk for it
+        if size == 0:
+            return b""
+        return await anext(self._chunks, b"")
+
+async def stream_json_items(url, prefix):
+    """Yield the items under an ijson prefix (e.g. "objects.item") without holding the whole document, when ijson is installed."""
+    if ijson is None:
+        data = await fetch_json(url)
+        for key in prefix.split(".")[:-1]:
+            data = data.get(key, []) if isinstance(data, dict) else []
+        for item in data:
+            yield item
+        return
+    entry = http_cache_entry(url)
+    async with get_http_client().stream("GET", url, headers=conditional_headers(entry)) as resp:
+        if resp.status_code != 304 or not entry:
+            resp.raise_for_status()
+            async for item in ijson.items(AsyncByteReader(caching_chunks(url, resp)), prefix, use_float=True):
+                yield item
+            return
+        yielded = False
+        try:
+            async for item in ijson.items(AsyncByteReader(cached_chunks(url)), prefix, use_float=True):
+                yielded = True
+                yield item
+            return
+        except (OSError, ijson.JSONError) as e:
+            drop_http_cache(url, e)
+            # Items already handed out can't be taken back; the next ingest fetches afresh
+            if yielded:
+                raise
+    async for item in stream_json_items(url, prefix):
+        yield item
+
+def listing_files(listing, max_n=None, suffix=".md"):
+    """Downloadable files from a GitHub contents listing, filtered by suffix before max_n is applied."""
+    files = [f for f in listing if f.get("type") == "file" and f.get("download_url") and f["name"].endswith(suffix)]
+    return files[:max_n]
+
+async def fetch_texts(urls):
+    """Fetch URLs concurrently, FETCH_CONCURRENCY at a time. A failed fetch yields its exception instead of text."""
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+    async def fetch_one(url):
+        async with semaphore:
+            try:
+                return await fetch_text(url)
+            except Exception as e:
+                return e
+
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(fetch_one(url)) for url in urls]
+    return [task.result() for task in tasks]
 
 # === INGESTION TOOLS ===
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_mitre_attack(domain: str = "enterprise") -> str:
     """Ingest MITRE ATT&CK framework techniques and tactics from the official STIX data. Domain can be enterprise, mobile, or ics."""
     try:
         url = f"https://raw.githubusercontent.com/mitre/cti/master/{domain}-attack/{domain}-attack.json"
         logger.info(f"Fetching MITRE ATT&CK {domain}...")
-        data = await fetch_json(url)
 
         count = 0
-        for obj in data.get("objects", []):
+        async for obj in stream_json_items(url, "objects.item"):
             if obj.get("type") == "attack-pattern" and not obj.get("revoked", False):
                 ext_refs = obj.get("external_references", [])
                 mitre_id = ""
@@ -215,9 +821,12 @@ async def ingest_mitre_attack(domain: str = "enterprise") -> str:
     except Exception as e:
         logger.error(f"MITRE ingest error: {e}")
         return f"❌ Error ingesting MITRE ATT&CK: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_gtfobins(max_items: str = "500") -> str:
     """Ingest GTFOBins - Unix binaries that can be used for privilege escalation and security bypasses."""
     try:
@@ -226,20 +835,19 @@ async def ingest_gtfobins(max_items: str = "500") -> str:
         logger.info("Fetching GTFOBins index...")
         files = await fetch_json(api_url)
 
+        files = listing_files(files, max_n, suffix="")
+        contents = await fetch_texts([f["download_url"] for f in files])
+
         count = 0
-        for f in files[:max_n]:
-            if f.get("type") != "file":
-                continue
+        for f, content in zip(files, contents):
             binary_name = f["name"].replace(".md", "")
             try:
-                raw_url = f["download_url"]
-                if not raw_url:
-                    continue
-                content = await fetch_text(raw_url)
+                if isinstance(content, Exception):
+                    raise content
 
                 functions = []
-                for match in re.findall(r"functions:\s*\n((?:\s+-\s+\w+\n?)+)", content):
-                    functions.extend(re.findall(r"-\s+(\w+)", match))
+                for match in GTFO_FUNCTIONS_RE.findall(content):
+                    functions.extend(GTFO_FUNCTION_NAME_RE.findall(match))
 
                 tags = ["gtfobins", "privilege-escalation", "linux"] + functions
                 item_id = f"gtfo-{binary_name}"
@@ -264,9 +872,12 @@ async def ingest_gtfobins(max_items: str = "500") -> str:
     except Exception as e:
         logger.error(f"GTFOBins ingest error: {e}")
         return f"❌ Error ingesting GTFOBins: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_hacktricks(section: str = "pentesting-web") -> str:
     """Ingest HackTricks pentesting guides from GitHub. Sections: pentesting-web, linux-hardening, windows-hardening, network-services-pentesting, generic-methodologies-and-resources."""
     try:
@@ -274,12 +885,14 @@ async def ingest_hacktricks(section: str = "pentesting-web") -> str:
         logger.info(f"Fetching HackTricks section: {section}...")
         files = await fetch_json(api_url)
 
+        files = listing_files(files)
+        contents = await fetch_texts([f["download_url"] for f in files])
+
         count = 0
-        for f in files:
-            if f.get("type") != "file" or not f["name"].endswith(".md"):
-                continue
+        for f, content in zip(files, contents):
             try:
-                content = await fetch_text(f["download_url"])
+                if isinstance(content, Exception):
+                    raise content
                 topic = f["name"].replace(".md", "").replace("-", " ").title()
                 item_id = f"ht-{section}-{content_hash(f['name'])}"
 
@@ -303,9 +916,12 @@ async def ingest_hacktricks(section: str = "pentesting-web") -> str:
     except Exception as e:
         logger.error(f"HackTricks ingest error: {e}")
         return f"❌ Error ingesting HackTricks: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_owasp(resource: str = "top10") -> str:
     """Ingest OWASP resources. Resource options: top10, cheatsheets."""
     try:
@@ -321,12 +937,14 @@ async def ingest_owasp(resource: str = "top10") -> str:
         logger.info(f"Fetching OWASP {resource}...")
         files = await fetch_json(api_url)
 
+        md_files = listing_files(files)
+        contents = await fetch_texts([f["download_url"] for f in md_files])
+
         count = 0
-        for f in files:
-            if not f["name"].endswith(".md"):
-                continue
+        for f, content in zip(md_files, contents):
             try:
-                content = await fetch_text(f["download_url"])
+                if isinstance(content, Exception):
+                    raise content
                 topic = f["name"].replace(".md", "").replace("_", " ").replace("-", " ").title()
                 item_id = f"owasp-{resource}-{content_hash(f['name'])}"
 
@@ -350,9 +968,12 @@ async def ingest_owasp(resource: str = "top10") -> str:
     except Exception as e:
         logger.error(f"OWASP ingest error: {e}")
         return f"❌ Error ingesting OWASP: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_payloads(category: str = "SQL Injection") -> str:
     """Ingest PayloadsAllTheThings exploit content by category. Categories include: SQL Injection, XSS Injection, Command Injection, Directory Traversal, Server Side Request Forgery, XXE Injection, and many more."""
     try:
@@ -361,12 +982,14 @@ async def ingest_payloads(category: str = "SQL Injection") -> str:
         logger.info(f"Fetching PayloadsAllTheThings: {category}...")
         files = await fetch_json(api_url)
 
+        md_files = listing_files(files)
+        contents = await fetch_texts([f["download_url"] for f in md_files])
+
         count = 0
-        for f in files:
-            if not f["name"].endswith(".md"):
-                continue
+        for f, content in zip(md_files, contents):
             try:
-                content = await fetch_text(f["download_url"])
+                if isinstance(content, Exception):
+                    raise content
                 topic = f["name"].replace(".md", "").replace("-", " ").title()
                 fname = f["name"]
                 item_id = f"payload-{content_hash(category + '-' + fname)}"
@@ -391,9 +1014,12 @@ async def ingest_payloads(category: str = "SQL Injection") -> str:
     except Exception as e:
         logger.error(f"Payloads ingest error: {e}")
         return f"❌ Error ingesting PayloadsAllTheThings: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_wadcoms(max_items: str = "500") -> str:
     """Ingest WADComs - Windows/Active Directory interactive cheat sheet with attack commands for enumeration, exploitation, and lateral movement. Similar to GTFOBins but for Windows/AD environments."""
     try:
@@ -402,45 +1028,25 @@ async def ingest_wadcoms(max_items: str = "500") -> str:
         logger.info("Fetching WADComs index...")
         files = await fetch_json(api_url)
 
+        files = listing_files(files, max_n)
+        contents = await fetch_texts([f["download_url"] for f in files])
+        frontmatters = await map_cpu(parse_wadcoms_frontmatter, contents)
+
         count = 0
-        for f in files[:max_n]:
-            if f.get("type") != "file" or not f["name"].endswith(".md"):
-                continue
+        for f, content, frontmatter in zip(files, contents, frontmatters):
             try:
-                content = await fetch_text(f["download_url"])
+                if isinstance(content, Exception):
+                    raise content
+                if isinstance(frontmatter, Exception):
+                    raise frontmatter
                 tool_name = f["name"].replace(".md", "")
 
-                # Parse YAML frontmatter for structured metadata
-                description = ""
-                command = ""
-                items = []
-                services = []
-                os_info = []
-                attack_type = []
-
-                if content.startswith("---"):
-                    parts = content.split("---", 2)
-                    if len(parts) >= 3:
-                        frontmatter = parts[1]
-                        # Extract fields from YAML
-                        desc_match = re.search(r'description:\s*\|\s*\n(.*?)(?=\n\w|\ncommand:)', frontmatter, re.DOTALL)
-                        if desc_match:
-                            description = desc_match.group(1).strip()
-                        cmd_match = re.search(r'command:\s*\|\s*\n(.*?)(?=\n\w|\Z)', frontmatter, re.DOTALL)
-                        if cmd_match:
-                            command = cmd_match.group(1).strip()
-                        items_match = re.search(r'items:\s*\n((?:\s*-\s*.+\n?)+)', frontmatter)
-                        if items_match:
-                            items = re.findall(r'-\s*(.+)', items_match.group(1))
-                        services_match = re.search(r'services:\s*\n((?:\s*-\s*.+\n?)+)', frontmatter)
-                        if services_match:
-                            services = re.findall(r'-\s*(.+)', services_match.group(1))
-                        os_match = re.search(r'OS:\s*\n((?:\s*-\s*.+\n?)+)', frontmatter)
-                        if os_match:
-                            os_info = re.findall(r'-\s*(.+)', os_match.group(1))
-                        attack_match = re.search(r'attack_type:\s*\n((?:\s*-\s*.+\n?)+)', frontmatter)
-                        if attack_match:
-                            attack_type = re.findall(r'-\s*(.+)', attack_match.group(1))
+                description = frontmatter["description"]
+                command = frontmatter["command"]
+                items = frontmatter["items"]
+                services = frontmatter["services"]
+                os_info = frontmatter["OS"]
+                attack_type = frontmatter["attack_type"]
 
                 # Build rich content for embedding
                 rich_content = f"# WADComs: {tool_name}\n\n"
@@ -480,11 +1086,14 @@ async def ingest_wadcoms(max_items: str = "500") -> str:
     except Exception as e:
         logger.error(f"WADComs ingest error: {e}")
         return f"❌ Error ingesting WADComs: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 # === BUG BOUNTY INGESTION TOOLS ===
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_bugbounty_writeups() -> str:
     """Ingest Awesome-Bugbounty-Writeups - curated collection of hundreds of bug bounty writeup links organized by vulnerability type (XSS, CSRF, SQLi, SSRF, IDOR, RCE, LFI, etc.)."""
     try:
@@ -492,25 +1101,8 @@ async def ingest_bugbounty_writeups() -> str:
         logger.info("Fetching Awesome-Bugbounty-Writeups...")
         content = await fetch_text(url)
 
-        # Parse sections and links
-        current_section = "general"
         count = 0
-        section_items = {}
-
-        for line in content.split("\n"):
-            line = line.strip()
-            # Detect section headers
-            if line.startswith("## "):
-                current_section = line.replace("## ", "").strip()
-                if current_section not in section_items:
-                    section_items[current_section] = []
-            # Detect writeup links
-            elif line.startswith("- [") and "](http" in line:
-                match = re.match(r'-\s*\[([^\]]+)\]\(([^)]+)\)', line)
-                if match:
-                    title = match.group(1)
-                    link = match.group(2)
-                    section_items.setdefault(current_section, []).append((title, link))
+        section_items = await run_cpu(parse_writeup_sections, content)
 
         # Store each section as a knowledge item with all its writeup links
         for section, items in section_items.items():
@@ -562,9 +1154,12 @@ async def ingest_bugbounty_writeups() -> str:
     except Exception as e:
         logger.error(f"Bugbounty writeups ingest error: {e}")
         return f"❌ Error: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_hackerone_reports(max_items: str = "200") -> str:
     """Ingest full disclosed HackerOne bug bounty reports from the community archive (1000+ reports covering XSS, RCE, SSRF, IDOR, SQLi, and more)."""
     try:
@@ -573,51 +1168,26 @@ async def ingest_hackerone_reports(max_items: str = "200") -> str:
         logger.info("Fetching HackerOne disclosed reports index...")
         files = await fetch_json(api_url)
 
+        files = listing_files(files, max_n)
+        contents = await fetch_texts([f["download_url"] for f in files])
+        detections = await map_cpu(detect_vuln_types, contents)
+
         count = 0
-        for f in files[:max_n]:
-            if not f["name"].endswith(".md"):
-                continue
+        for f, content, detected in zip(files, contents, detections):
             try:
-                content = await fetch_text(f["download_url"])
+                if isinstance(content, Exception):
+                    raise content
+                if isinstance(detected, Exception):
+                    raise detected
                 # Parse report ID and title from filename: 1234567_Title_Here.md
                 fname = f["name"].replace(".md", "")
                 parts = fname.split("_", 1)
                 report_id = parts[0] if parts[0].isdigit() else ""
                 report_title = parts[1].replace("_", " ") if len(parts) > 1 else fname
 
-                # Auto-detect vulnerability type from content
-                content_lower = content.lower()
-                tags = ["hackerone", "bug-bounty", "disclosed"]
-                vuln_types = {
-                    "xss": ["xss", "cross-site scripting", "script injection"],
-                    "sqli": ["sql injection", "sqli", "sql query"],
-                    "ssrf": ["ssrf", "server-side request forgery"],
-                    "idor": ["idor", "insecure direct object"],
-                    "rce": ["rce", "remote code execution", "command injection"],
-                    "csrf": ["csrf", "cross-site request forgery"],
-                    "lfi": ["lfi", "local file inclusion", "path traversal", "directory traversal"],
-                    "xxe": ["xxe", "xml external entity"],
-                    "open-redirect": ["open redirect", "url redirect"],
-                    "info-disclosure": ["information disclosure", "sensitive data", "data exposure"],
-                    "auth-bypass": ["authentication bypass", "authorization bypass", "access control"],
-                    "subdomain-takeover": ["subdomain takeover"],
-                    "dos": ["denial of service", "dos", "redos"],
-                    "race-condition": ["race condition", "toctou"],
-                    "deserialization": ["deserialization", "insecure deserialization"],
-                    "ssti": ["template injection", "ssti"],
-                    "graphql": ["graphql"],
-                    "cors": ["cors", "cross-origin"],
-                    "upload": ["file upload", "unrestricted upload"],
-                    "prototype-pollution": ["prototype pollution"]
-                }
-                detected_category = "general"
-                for vuln_tag, keywords in vuln_types.items():
-                    for kw in keywords:
-                        if kw in content_lower:
-                            tags.append(vuln_tag)
-                            if detected_category == "general":
-                                detected_category = vuln_tag
-                            break
+                vuln_tags, detected_category = detected
+                tags = {"hackerone", "bug-bounty", "disclosed"}
+                tags.update(vuln_tags)
 
                 item_id = f"h1-report-{report_id}" if report_id else f"h1-report-{content_hash(fname)}"
                 store_knowledge(
@@ -627,7 +1197,7 @@ async def ingest_hackerone_reports(max_items: str = "200") -> str:
                     source="hackerone-disclosed",
                     category=detected_category,
                     subcategory="disclosed-report",
-                    tags=list(set(tags)),
+                    tags=sorted(tags),
                     url=f"https://hackerone.com/reports/{report_id}" if report_id else f["html_url"]
                 )
                 count += 1
@@ -640,9 +1210,12 @@ async def ingest_hackerone_reports(max_items: str = "200") -> str:
     except Exception as e:
         logger.error(f"HackerOne reports ingest error: {e}")
         return f"❌ Error: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_hackerone_tops() -> str:
     """Ingest top-rated HackerOne reports organized by bug type (XSS, SQLi, SSRF, RCE, CSRF, IDOR, etc.) - 27 categories with ranked reports including upvotes and bounty amounts."""
     try:
@@ -650,19 +1223,21 @@ async def ingest_hackerone_tops() -> str:
         logger.info("Fetching HackerOne tops by bug type...")
         files = await fetch_json(api_url)
 
+        md_files = listing_files(files)
+        contents = await fetch_texts([f["download_url"] for f in md_files])
+
         count = 0
-        for f in files:
-            if not f["name"].endswith(".md"):
-                continue
+        for f, content in zip(md_files, contents):
             try:
-                content = await fetch_text(f["download_url"])
+                if isinstance(content, Exception):
+                    raise content
                 bug_type = f["name"].replace("TOP", "").replace(".md", "").strip()
                 bug_type_readable = bug_type.replace("_", " ").title()
 
                 # Parse individual report entries from the markdown
                 reports_found = []
                 for line in content.split("\n"):
-                    match = re.search(r'\[([^\]]+)\]\(https://hackerone\.com/reports/(\d+)\)[^-]*-\s*(\d+)\s*upvotes?,\s*\$?([\d,]+)', line)
+                    match = H1_TOP_REPORT_RE.search(line)
                     if match:
                         reports_found.append({
                             "title": match.group(1),
@@ -675,7 +1250,7 @@ async def ingest_hackerone_tops() -> str:
                 item_id = f"h1-top-{content_hash(bug_type)}"
                 tags = ["hackerone", "bug-bounty", "top-reports", bug_type.lower().replace(" ", "-")]
 
-                store_knowledge(
+                batch = [dict(
                     item_id=item_id,
                     title=f"Top HackerOne Reports: {bug_type_readable}",
                     content=content,
@@ -684,8 +1259,7 @@ async def ingest_hackerone_tops() -> str:
                     subcategory=bug_type.lower(),
                     tags=tags,
                     url=f["html_url"]
-                )
-                count += 1
+                )]
 
                 # Also store top 10 individual reports for granular search
                 for report in reports_found[:10]:
@@ -696,7 +1270,7 @@ async def ingest_hackerone_tops() -> str:
                     r_content += f"**Bounty:** ${report['bounty']}\n"
                     r_content += f"**Report:** https://hackerone.com/reports/{report['report_id']}\n"
 
-                    store_knowledge(
+                    batch.append(dict(
                         item_id=r_id,
                         title=report["title"],
                         content=r_content,
@@ -705,8 +1279,10 @@ async def ingest_hackerone_tops() -> str:
                         subcategory="top-report",
                         tags=tags + ["top-rated"],
                         url=f"https://hackerone.com/reports/{report['report_id']}"
-                    )
-                    count += 1
+                    ))
+
+                store_knowledge_bulk(batch)
+                count += len(batch)
 
             except Exception as e:
                 logger.warning(f"Failed to fetch {f['name']}: {e}")
@@ -717,9 +1293,12 @@ async def ingest_hackerone_tops() -> str:
     except Exception as e:
         logger.error(f"HackerOne tops ingest error: {e}")
         return f"❌ Error: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_hackerone_api(h1_username: str = "", h1_api_token: str = "", max_pages: str = "5") -> str:
     """Ingest disclosed reports directly from HackerOne's official API with structured severity, CWE, and bounty data. Requires HackerOne API credentials (free hacker account)."""
     try:
@@ -732,161 +1311,181 @@ async def ingest_hackerone_api(h1_username: str = "", h1_api_token: str = "", ma
                     "4. Call this tool with your username and token\n\n"
                     "Or use ingest_hackerone_reports for the GitHub archive (no credentials needed).")
 
-        import httpx
         from base64 import b64encode
         pages = int(max_pages)
         auth_header = b64encode(f"{h1_username}:{h1_api_token}".encode()).decode()
         base_url = "https://api.hackerone.com/v1/hackers/hacktivity"
         count = 0
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            for page in range(1, pages + 1):
-                params = {
-                    "queryString": "disclosed:true",
-                    "page[number]": page,
-                    "page[size]": 25
-                }
-                headers = {
-                    "Authorization": f"Basic {auth_header}",
-                    "Accept": "application/json"
-                }
+        client = get_http_client()
+        headers = {
+            "Authorization": f"Basic {auth_header}",
+            "Accept": "application/json"
+        }
+        semaphore = asyncio.Semaphore(H1_API_CONCURRENCY)
+
+        async def fetch_page(page):
+            params = {
+                "queryString": "disclosed:true",
+                "page[number]": page,
+                "page[size]": 25
+            }
+            async with semaphore:
                 logger.info(f"Fetching HackerOne API page {page}/{pages}...")
+                resp = await client.get(base_url, params=params, headers=headers)
+            if resp.status_code == 401:
+                raise PermissionError("❌ Invalid HackerOne credentials. Check your username and API token.")
+            resp.raise_for_status()
+            return resp.json().get("data", [])
 
-                try:
-                    resp = await client.get(base_url, params=params, headers=headers)
-                    if resp.status_code == 401:
-                        return "❌ Invalid HackerOne credentials. Check your username and API token."
-                    resp.raise_for_status()
-                    data = resp.json()
-                except Exception as e:
-                    logger.warning(f"API page {page} failed: {e}")
-                    break
-
-                reports = data.get("data", [])
-                if not reports:
-                    break
-
-                for report in reports:
-                    attrs = report.get("attributes", {})
-                    rels = report.get("relationships", {})
-
-                    title = attrs.get("title", "Unknown")
-                    report_id = str(report.get("id", ""))
-                    severity = attrs.get("severity_rating", "unknown")
-                    cwe = attrs.get("cwe", "")
-                    cve_ids = attrs.get("cve_ids", [])
-                    bounty = attrs.get("total_awarded_amount", 0)
-                    votes = attrs.get("votes", 0)
-                    url = attrs.get("url", "")
-                    disclosed_at = attrs.get("disclosed_at", "")
-
-                    # Get program and reporter info
-                    program_data = rels.get("program", {}).get("data", {}).get("attributes", {})
-                    program_name = program_data.get("name", "Unknown")
-                    reporter_data = rels.get("reporter", {}).get("data", {}).get("attributes", {})
-                    reporter = reporter_data.get("username", "anonymous")
-
-                    # Get AI summary if available
-                    summary_data = rels.get("report_generated_content", {}).get("data", {}).get("attributes", {})
-                    summary = summary_data.get("hacktivity_summary", "")
-
-                    full_content = f"# {title}\n\n"
-                    full_content += f"**Program:** {program_name}\n"
-                    full_content += f"**Severity:** {severity}\n"
-                    full_content += f"**CWE:** {cwe}\n" if cwe else ""
-                    full_content += f"**CVEs:** {', '.join(cve_ids)}\n" if cve_ids else ""
-                    full_content += f"**Bounty:** ${bounty}\n" if bounty else ""
-                    full_content += f"**Upvotes:** {votes}\n"
-                    full_content += f"**Reporter:** {reporter}\n"
-                    full_content += f"**Disclosed:** {disclosed_at}\n"
-                    full_content += f"**URL:** {url}\n"
-                    if summary:
-                        full_content += f"\n## Summary\n{summary}\n"
-
-                    tags = ["hackerone", "bug-bounty", "api-sourced", severity]
-                    if cwe:
-                        tags.append(cwe.lower().replace(" ", "-"))
-
-                    item_id = f"h1-api-{report_id}"
-                    store_knowledge(
-                        item_id=item_id,
-                        title=f"H1/{program_name}: {title}",
-                        content=full_content,
-                        source="hackerone-api",
-                        category=cwe.lower() if cwe else severity,
-                        subcategory=program_name.lower(),
-                        tags=tags,
-                        url=url
-                    )
-                    count += 1
+        # Probe the first page alone so bad credentials fail fast, then fetch the rest concurrently
+        try:
+            first_page = await fetch_page(1)
+        except PermissionError as e:
+            return str(e)
+        except Exception as e:
+            first_page = e
+        page_results = [first_page]
+        if pages > 1 and first_page and not isinstance(first_page, Exception):
+            page_results += await asyncio.gather(
+                *(fetch_page(page) for page in range(2, pages + 1)), return_exceptions=True)
+
+        for page, reports in enumerate(page_results, 1):
+            if isinstance(reports, Exception):
+                logger.warning(f"API page {page} failed: {reports}")
+                break
+            if not reports:
+                break
+
+            batch = []
+
+            for report in reports:
+                attrs = report.get("attributes", {})
+                rels = report.get("relationships", {})
+
+                title = attrs.get("title", "Unknown")
+                report_id = str(report.get("id", ""))
+                severity = attrs.get("severity_rating", "unknown")
+                cwe = attrs.get("cwe", "")
+                cve_ids = attrs.get("cve_ids", [])
+                bounty = attrs.get("total_awarded_amount", 0)
+                votes = attrs.get("votes", 0)
+                url = attrs.get("url", "")
+                disclosed_at = attrs.get("disclosed_at", "")
+
+                # Get program and reporter info
+                program_data = rels.get("program", {}).get("data", {}).get("attributes", {})
+                program_name = program_data.get("name", "Unknown")
+                reporter_data = rels.get("reporter", {}).get("data", {}).get("attributes", {})
+                reporter = reporter_data.get("username", "anonymous")
+
+                # Get AI summary if available
+                summary_data = rels.get("report_generated_content", {}).get("data", {}).get("attributes", {})
+                summary = summary_data.get("hacktivity_summary", "")
+
+                parts = [f"# {title}\n\n", f"**Program:** {program_name}\n", f"**Severity:** {severity}\n"]
+                if cwe:
+                    parts.append(f"**CWE:** {cwe}\n")
+                if cve_ids:
+                    parts.append(f"**CVEs:** {', '.join(cve_ids)}\n")
+                if bounty:
+                    parts.append(f"**Bounty:** ${bounty}\n")
+                parts += (
+                    f"**Upvotes:** {votes}\n",
+                    f"**Reporter:** {reporter}\n",
+                    f"**Disclosed:** {disclosed_at}\n",
+                    f"**URL:** {url}\n",
+                )
+                if summary:
+                    parts.append(f"\n## Summary\n{summary}\n")
+                full_content = "".join(parts)
+
+                tags = ["hackerone", "bug-bounty", "api-sourced", severity]
+                if cwe:
+                    tags.append(cwe.lower().replace(" ", "-"))
+
+                item_id = f"h1-api-{report_id}"
+                batch.append(dict(
+                    item_id=item_id,
+                    title=f"H1/{program_name}: {title}",
+                    content=full_content,
+                    source="hackerone-api",
+                    category=cwe.lower() if cwe else severity,
+                    subcategory=program_name.lower(),
+                    tags=tags,
+                    url=url
+                ))
+                count += 1
+            store_knowledge_bulk(batch)
 
         update_source("hackerone-api", count)
         return f"✅ Ingested {count} disclosed reports from HackerOne API ({pages} pages)."
     except Exception as e:
         logger.error(f"HackerOne API ingest error: {e}")
         return f"❌ Error: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 @mcp.tool()
+@bulk_ingest
 async def ingest_bugcrowd_taxonomy() -> str:
     """Ingest Bugcrowd's Vulnerability Rating Taxonomy (VRT) - the industry-standard classification mapping vulnerability types to severity ratings (P1-P5), including AI security, cloud, and web categories."""
     try:
         url = "https://raw.githubusercontent.com/bugcrowd/vulnerability-rating-taxonomy/master/vulnerability-rating-taxonomy.json"
         logger.info("Fetching Bugcrowd VRT...")
-        data = await fetch_json(url)
 
         count = 0
 
-        def process_vrt_node(node, parent_path=""):
-            nonlocal count
-            name = node.get("name", "Unknown")
-            node_id = node.get("id", "")
-            priority = node.get("priority", None)
-            path = f"{parent_path}/{name}" if parent_path else name
-
-            # Build content
-            content = f"# Bugcrowd VRT: {path}\n\n"
-            content += f"**ID:** {node_id}\n"
-            if priority:
-                content += f"**Priority:** {priority}\n"
-            content += f"**Full Path:** {path}\n\n"
-
-            # Map priority to severity for context
-            priority_map = {
-                1: "Critical (P1)", 2: "High (P2)", 3: "Medium (P3)",
-                4: "Low (P4)", 5: "Informational (P5)"
-            }
-            if priority and isinstance(priority, int):
-                content += f"**Severity:** {priority_map.get(priority, f'P{priority}')}\n"
-
-            tags = ["bugcrowd", "vrt", "taxonomy", "severity-rating"]
-            if priority:
-                tags.append(f"p{priority}")
-            # Add category-level tags
-            top_cat = path.split("/")[0].lower().replace(" ", "-") if path else ""
-            if top_cat:
-                tags.append(top_cat)
-
-            item_id = f"bc-vrt-{content_hash(node_id or path)}"
-            store_knowledge(
-                item_id=item_id,
-                title=f"VRT: {path}",
-                content=content,
-                source="bugcrowd-vrt",
-                category="taxonomy",
-                subcategory=top_cat,
-                tags=tags,
-                url="https://bugcrowd.com/vulnerability-rating-taxonomy"
-            )
-            count += 1
+        # VRT JSON has a "content" array at root; each top-level category subtree
+        # is streamed in, walked depth-first with an explicit stack and written as one batch
+        async for category in stream_json_items(url, "content.item"):
+            batch = []
+            stack = [(category, "", "")]
+            while stack:
+                node, parent_path, top_cat = stack.pop()
+                name = node.get("name", "Unknown")
+                node_id = node.get("id", "")
+                priority = node.get("priority", None)
+                path = f"{parent_path}/{name}" if parent_path else name
+
+                # Build content
+                parts = [f"# Bugcrowd VRT: {path}\n\n", f"**ID:** {node_id}\n"]
+                if priority:
+                    parts.append(f"**Priority:** {priority}\n")
+                parts.append(f"**Full Path:** {path}\n\n")
+
+                # Map priority to severity for context
+                if priority and isinstance(priority, int):
+                    parts.append(f"**Severity:** {VRT_PRIORITY_LABELS.get(priority, f'P{priority}')}\n")
+                content = "".join(parts)
+
+                tags = list(VRT_BASE_TAGS)
+                if priority:
+                    tags.append(f"p{priority}")
+                # Add category-level tags; the top-level slug is computed once per category
+                if not parent_path:
+                    top_cat = path.split("/")[0].lower().replace(" ", "-")
+                if top_cat:
+                    tags.append(top_cat)
+
+                item_id = f"bc-vrt-{content_hash(node_id or path)}"
+                batch.append(dict(
+                    item_id=item_id,
+                    title=f"VRT: {path}",
+                    content=content,
+                    source="bugcrowd-vrt",
+                    category="taxonomy",
+                    subcategory=top_cat,
+                    tags=tags,
+                    url="https://bugcrowd.com/vulnerability-rating-taxonomy"
+                ))
 
-            # Recurse into children
-            for child in node.get("children", []):
-                process_vrt_node(child, path)
+                # Reversed so children are visited in document order
+                stack.extend((child, path, top_cat) for child in reversed(node.get("children") or ()))
 
-        # VRT JSON has a "content" array at root
-        for category in data.get("content", data if isinstance(data, list) else []):
-            process_vrt_node(category)
+            store_knowledge_bulk(batch)
+            count += len(batch)
 
         # Also fetch the CHANGELOG for context on what's new
         try:
@@ -911,6 +1510,8 @@ async def ingest_bugcrowd_taxonomy() -> str:
     except Exception as e:
         logger.error(f"Bugcrowd VRT ingest error: {e}")
         return f"❌ Error: {str(e)}"
+    finally:
+        flush_knowledge()
 
 
 # === SEARCH & BROWSE TOOLS ===
@@ -923,10 +1524,11 @@ async def search_knowledge(query: str = "", top_k: str = "10") -> str:
             return "❌ Please provide a search query."
         k = int(top_k)
         collection = get_collection()
-        if not collection or collection.count() == 0:
+        if not collection:
             return "❌ Knowledge base is empty. Run an ingest command first."
 
-        results = collection.query(query_texts=[query], n_results=min(k, collection.count()))
+        # Chroma clamps n_results to the collection size itself; the query embeds the text, so keep it off the event loop
+        results = await asyncio.to_thread(collection.query, query_texts=[query], n_results=k)
 
         if not results["documents"] or not results["documents"][0]:
             return f"No results found for: {query}"
@@ -977,7 +1579,6 @@ async def browse_topics(source: str = "", category: str = "") -> str:
             rows = conn.execute(
                 "SELECT source, COUNT(*) as cnt FROM knowledge GROUP BY source ORDER BY cnt DESC").fetchall()
             header = "📂 All sources in knowledge base"
-        conn.close()
 
         if not rows:
             return "Knowledge base is empty. Run an ingest command first."
@@ -1003,7 +1604,6 @@ async def get_technique(identifier: str = "") -> str:
             rows = conn.execute("SELECT * FROM knowledge WHERE title LIKE ? LIMIT 1",
                                (f"%{identifier}%",)).fetchone()
             row = rows
-        conn.close()
 
         if not row:
             return f"No technique found for: {identifier}. Try search_knowledge for fuzzy matching."
@@ -1017,7 +1617,7 @@ async def get_technique(identifier: str = "") -> str:
             output += f"**Subcategory:** {row['subcategory']}\n"
         if row['url']:
             output += f"**URL:** {row['url']}\n"
-        tags = json.loads(row['tags']) if row['tags'] else []
+        tags = parse_tags(row['tags'])
         if tags:
             output += f"**Tags:** {', '.join(tags)}\n"
         output += f"\n---\n\n{row['content']}"
@@ -1035,7 +1635,6 @@ async def get_attack_chain(tactic: str = "") -> str:
             rows = conn.execute(
                 "SELECT DISTINCT subcategory, COUNT(*) as cnt FROM knowledge WHERE source='mitre-attack' AND subcategory != '' GROUP BY subcategory ORDER BY cnt DESC"
             ).fetchall()
-            conn.close()
             if not rows:
                 return "❌ No MITRE ATT&CK data. Run ingest_mitre_attack first."
             output = "🔗 Available tactics:\n\n"
@@ -1046,9 +1645,9 @@ async def get_attack_chain(tactic: str = "") -> str:
 
         conn = get_db()
         rows = conn.execute(
-            "SELECT mitre_id, title, tags FROM knowledge WHERE source='mitre-attack' AND (subcategory=? OR tags LIKE ?) ORDER BY mitre_id",
-            (tactic, f'%"{tactic}"%')).fetchall()
-        conn.close()
+            "SELECT mitre_id, title, tags FROM knowledge WHERE source='mitre-attack' AND "
+            "(subcategory=? OR id IN (SELECT item_id FROM knowledge_tags WHERE tag=?)) ORDER BY mitre_id",
+            (tactic, tactic)).fetchall()
 
         if not rows:
             return f"No techniques found for tactic: {tactic}"
@@ -1064,6 +1663,39 @@ async def get_attack_chain(tactic: str = "") -> str:
 
 # === EXPORT & MANAGEMENT TOOLS ===
 
+@functools.lru_cache(maxsize=256)
+def split_sections(content):
+    """Split long export content before each markdown header; cached for repeated exports of the same items."""
+    return tuple(HEADER_SPLIT_RE.split(content))
+
+def wiki_link_tags(content, tags):
+    """Turn the first occurrence of each tag in content into an Obsidian [[wiki-link]] in a single pass."""
+    tags = [tag for tag in tags if tag]
+    if not tags:
+        return content
+    # Longest first so a tag is not pre-empted by a shorter tag it starts with
+    pattern = re.compile("|".join(re.escape(tag) for tag in sorted(tags, key=len, reverse=True)))
+    linked = set()
+
+    def link(match):
+        tag = match.group(0)
+        if tag in linked:
+            return tag
+        linked.add(tag)
+        return f"[[{tag}]]"
+
+    return pattern.sub(link, content)
+
+async def write_files(files):
+    """Write (path, text) pairs as UTF-8 from worker threads, EXPORT_WRITE_CONCURRENCY at a time."""
+    semaphore = asyncio.Semaphore(EXPORT_WRITE_CONCURRENCY)
+
+    async def write_one(path, text):
+        async with semaphore:
+            await asyncio.to_thread(path.write_text, text, encoding="utf-8")
+
+    await asyncio.gather(*(write_one(path, text) for path, text in files))
+
 @mcp.tool()
 async def export_obsidian(source: str = "", category: str = "", max_items: str = "100") -> str:
     """Export knowledge base entries as Obsidian-compatible markdown files with YAML frontmatter and wiki-links."""
@@ -1071,42 +1703,42 @@ async def export_obsidian(source: str = "", category: str = "", max_items: str =
         max_n = int(max_items)
         conn = get_db()
         if source:
-            rows = conn.execute("SELECT * FROM knowledge WHERE source=? LIMIT ?", (source, max_n)).fetchall()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge WHERE source=? LIMIT ?", (source, max_n))
         elif category:
-            rows = conn.execute("SELECT * FROM knowledge WHERE category=? LIMIT ?", (category, max_n)).fetchall()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge WHERE category=? LIMIT ?", (category, max_n))
         else:
-            rows = conn.execute("SELECT * FROM knowledge LIMIT ?", (max_n,)).fetchall()
-        conn.close()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge LIMIT ?", (max_n,))
 
-        if not rows:
+        rows = stream_rows(cursor)
+        if rows is None:
             return "❌ No items to export."
 
+        # Keyed by path so a later row with the same safe title still wins, as with sequential writes
+        to_write = {}
         count = 0
-        for row in rows:
-            tags = json.loads(row["tags"]) if row["tags"] else []
-            safe_title = re.sub(r'[<>:"/\\|?*]', '_', row["title"])[:100]
+        for _, title, content, src, cat, _, tags_json, mitre_id, url, updated_at in rows:
+            tags = parse_tags(tags_json)
+            safe_title = UNSAFE_FILENAME_RE.sub('_', title)[:100]
 
             frontmatter = "---\n"
-            frontmatter += f"title: \"{row['title']}\"\n"
-            frontmatter += f"source: {row['source']}\n"
-            frontmatter += f"category: {row['category']}\n"
-            if row['mitre_id']:
-                frontmatter += f"mitre_id: {row['mitre_id']}\n"
+            frontmatter += f"title: \"{title}\"\n"
+            frontmatter += f"source: {src}\n"
+            frontmatter += f"category: {cat}\n"
+            if mitre_id:
+                frontmatter += f"mitre_id: {mitre_id}\n"
             if tags:
                 frontmatter += f"tags: [{', '.join(tags[:10])}]\n"
-            if row['url']:
-                frontmatter += f"url: {row['url']}\n"
-            frontmatter += f"updated: {row['updated_at']}\n"
+            if url:
+                frontmatter += f"url: {url}\n"
+            frontmatter += f"updated: {updated_at}\n"
             frontmatter += "---\n\n"
 
-            wiki_content = row["content"]
-            for tag in tags[:5]:
-                wiki_content = wiki_content.replace(tag, f"[[{tag}]]", 1)
+            wiki_content = wiki_link_tags(content, tags[:5])
 
-            filepath = OBSIDIAN_DIR / f"{safe_title}.md"
-            filepath.write_text(frontmatter + wiki_content, encoding="utf-8")
+            to_write[OBSIDIAN_DIR / f"{safe_title}.md"] = frontmatter + wiki_content
             count += 1
 
+        await write_files(to_write.items())
         return f"✅ Exported {count} files to {OBSIDIAN_DIR}\n📁 Copy this folder to your Obsidian vault."
     except Exception as e:
         return f"❌ Export error: {str(e)}"
@@ -1118,12 +1750,12 @@ async def export_rag_dataset(format_type: str = "jsonl", source: str = "") -> st
     try:
         conn = get_db()
         if source:
-            rows = conn.execute("SELECT * FROM knowledge WHERE source=?", (source,)).fetchall()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge WHERE source=?", (source,))
         else:
-            rows = conn.execute("SELECT * FROM knowledge").fetchall()
-        conn.close()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge")
 
-        if not rows:
+        rows = stream_rows(cursor)
+        if rows is None:
             return "❌ No data to export."
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1131,31 +1763,31 @@ async def export_rag_dataset(format_type: str = "jsonl", source: str = "") -> st
 
         if format_type == "jsonl":
             export_path = EXPORTS_DIR / f"cyberrag_export_{timestamp}.jsonl"
-            with open(export_path, "w") as f:
-                for row in rows:
+            with open(export_path, "wb", buffering=EXPORT_WRITE_BUFFER) as f:
+                for item_id, title, content, src, cat, _, tags_json, mitre_id, url, _ in rows:
                     entry = {
-                        "id": row["id"],
-                        "title": row["title"],
-                        "content": row["content"],
-                        "source": row["source"],
-                        "category": row["category"],
-                        "mitre_id": row["mitre_id"],
-                        "tags": json.loads(row["tags"]) if row["tags"] else [],
-                        "url": row["url"]
+                        "id": item_id,
+                        "title": title,
+                        "content": content,
+                        "source": src,
+                        "category": cat,
+                        "mitre_id": mitre_id,
+                        "tags": parse_tags(tags_json),
+                        "url": url
                     }
-                    f.write(json.dumps(entry) + "\n")
+                    f.write(orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE))
                     count += 1
         elif format_type == "qa":
             export_path = EXPORTS_DIR / f"cyberrag_qa_{timestamp}.jsonl"
-            with open(export_path, "w") as f:
-                for row in rows:
+            with open(export_path, "wb", buffering=EXPORT_WRITE_BUFFER) as f:
+                for _, title, content, src, _, _, _, mitre_id, _, _ in rows:
                     entry = {
-                        "question": f"What is {row['title']}?",
-                        "answer": row["content"][:2000],
-                        "source": row["source"],
-                        "mitre_id": row["mitre_id"]
+                        "question": f"What is {title}?",
+                        "answer": content[:2000],
+                        "source": src,
+                        "mitre_id": mitre_id
                     }
-                    f.write(json.dumps(entry) + "\n")
+                    f.write(orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE))
                     count += 1
         else:
             return f"❌ Unknown format: {format_type}. Use 'jsonl' or 'qa'."
@@ -1172,14 +1804,14 @@ async def export_openwebui(source: str = "", category: str = "", max_items: str
         max_n = int(max_items)
         conn = get_db()
         if source:
-            rows = conn.execute("SELECT * FROM knowledge WHERE source=? LIMIT ?", (source, max_n)).fetchall()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge WHERE source=? LIMIT ?", (source, max_n))
         elif category:
-            rows = conn.execute("SELECT * FROM knowledge WHERE category=? LIMIT ?", (category, max_n)).fetchall()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge WHERE category=? LIMIT ?", (category, max_n))
         else:
-            rows = conn.execute("SELECT * FROM knowledge LIMIT ?", (max_n,)).fetchall()
-        conn.close()
+            cursor = conn.execute(f"SELECT {EXPORT_COLUMNS} FROM knowledge LIMIT ?", (max_n,))
 
-        if not rows:
+        rows = stream_rows(cursor)
+        if rows is None:
             return "❌ No items to export."
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -1187,110 +1819,116 @@ async def export_openwebui(source: str = "", category: str = "", max_items: str
         export_dir.mkdir(exist_ok=True)
 
         count = 0
+        to_write = {}
         source_groups = {}
         for row in rows:
-            src = row["source"]
-            source_groups.setdefault(src, []).append(row)
+            source_groups.setdefault(row[3], []).append(row)
 
         for src, items in source_groups.items():
             cat_groups = {}
             for item in items:
-                cat = item["category"] or "general"
-                cat_groups.setdefault(cat, []).append(item)
+                cat_groups.setdefault(item[4] or "general", []).append(item)
 
             for cat, cat_items in cat_groups.items():
-                safe_name = re.sub(r'[<>:"/\\|?*]', '_', f"{src}_{cat}")[:80]
-
-                doc = "---\n"
-                doc += f"title: \"CyberRAG: {src.replace('-', ' ').title()} - {cat.replace('-', ' ').title()}\"\n"
-                doc += f"source: {src}\n"
-                doc += f"category: {cat}\n"
-                doc += f"item_count: {len(cat_items)}\n"
-                doc += f"exported: {datetime.now(timezone.utc).isoformat()}\n"
-                doc += f"description: \"Cybersecurity knowledge base - {src} {cat} content for RAG retrieval\"\n"
-                doc += "---\n\n"
-
-                doc += f"# {src.replace('-', ' ').title()}: {cat.replace('-', ' ').title()}\n\n"
-
-                for item in cat_items:
-                    tags = json.loads(item["tags"]) if item["tags"] else []
-                    content = item["content"]
-
-                    content = re.sub(r'<[^>]+>', '', content)
-                    content = re.sub(r'!\[[^\]]*\]\([^)]+\)', '', content)
-                    content = re.sub(r'\n{3,}', '\n\n', content)
-                    content = re.sub(r'(?i)(table of contents|back to top|click here|read more\.\.\.)', '', content)
+                safe_name = UNSAFE_FILENAME_RE.sub('_', f"{src}_{cat}")[:80]
+
+                src_title = src.replace('-', ' ').title()
+                cat_title = cat.replace('-', ' ').title()
+                doc = [
+                    "---\n",
+                    f"title: \"CyberRAG: {src_title} - {cat_title}\"\n",
+                    f"source: {src}\n",
+                    f"category: {cat}\n",
+                    f"item_count: {len(cat_items)}\n",
+                    f"exported: {datetime.now(timezone.utc).isoformat()}\n",
+                    f"description: \"Cybersecurity knowledge base - {src} {cat} content for RAG retrieval\"\n",
+                    "---\n\n",
+                    f"# {src_title}: {cat_title}\n\n",
+                ]
+
+                for _, title, content, _, _, subcategory, tags_json, mitre_id, url, _ in cat_items:
+                    tags = parse_tags(tags_json)
+
+                    content = HTML_TAG_RE.sub('', content)
+                    content = IMAGE_MARKDOWN_RE.sub('', content)
+                    content = EXCESS_NEWLINES_RE.sub('\n\n', content)
+                    content = EXPORT_NOISE_RE.sub('', content)
                     content = content.strip()
 
                     if not content:
                         continue
 
-                    doc += f"## {item['title']}\n\n"
+                    doc.append(f"## {title}\n\n")
 
                     meta_parts = []
-                    if item['mitre_id']:
-                        meta_parts.append(f"**MITRE ID:** {item['mitre_id']}")
-                    if item['url']:
-                        meta_parts.append(f"**Source URL:** {item['url']}")
+                    if mitre_id:
+                        meta_parts.append(f"**MITRE ID:** {mitre_id}")
+                    if url:
+                        meta_parts.append(f"**Source URL:** {url}")
                     if tags:
                         meta_parts.append(f"**Tags:** {', '.join(tags[:10])}")
-                    if item['subcategory'] and item['subcategory'] != cat:
-                        meta_parts.append(f"**Subcategory:** {item['subcategory']}")
+                    if subcategory and subcategory != cat:
+                        meta_parts.append(f"**Subcategory:** {subcategory}")
 
                     if meta_parts:
-                        doc += " | ".join(meta_parts) + "\n\n"
+                        doc.append(" | ".join(meta_parts) + "\n\n")
 
                     if len(content) > 4000:
-                        sections = re.split(r'\n(?=#{1,6}\s)', content)
+                        sections = split_sections(content)
                         if len(sections) <= 1:
                             paragraphs = content.split('\n\n')
-                            current_section = ""
+                            current_section = []
+                            section_len = 0
                             section_num = 1
                             for para in paragraphs:
-                                if len(current_section) + len(para) > 1500 and current_section:
-                                    doc += f"### Section {section_num}\n\n{current_section.strip()}\n\n"
-                                    current_section = para + "\n\n"
+                                if section_len + len(para) > 1500 and current_section:
+                                    doc.append(f"### Section {section_num}\n\n{''.join(current_section).strip()}\n\n")
+                                    current_section = [para, "\n\n"]
+                                    section_len = len(para) + 2
                                     section_num += 1
                                 else:
-                                    current_section += para + "\n\n"
-                            if current_section.strip():
+                                    current_section += (para, "\n\n")
+                                    section_len += len(para) + 2
+                            last_section = "".join(current_section).strip()
+                            if last_section:
                                 if section_num > 1:
-                                    doc += f"### Section {section_num}\n\n{current_section.strip()}\n\n"
+                                    doc.append(f"### Section {section_num}\n\n{last_section}\n\n")
                                 else:
-                                    doc += current_section.strip() + "\n\n"
+                                    doc.append(last_section + "\n\n")
                         else:
                             for section in sections:
                                 section = section.strip()
                                 if section:
-                                    section = re.sub(r'^(#{1,2})\s', '### ', section)
-                                    doc += section + "\n\n"
+                                    section = HEADER_DEMOTE_RE.sub('### ', section)
+                                    doc.append(section + "\n\n")
                     else:
-                        doc += content + "\n\n"
+                        doc.append(content + "\n\n")
 
-                    doc += "---\n\n"
+                    doc.append("---\n\n")
                     count += 1
 
-                filepath = export_dir / f"{safe_name}.md"
-                filepath.write_text(doc, encoding="utf-8")
-
-        index_doc = "---\n"
-        index_doc += "title: \"CyberRAG Knowledge Base Index\"\n"
-        index_doc += f"exported: {datetime.now(timezone.utc).isoformat()}\n"
-        index_doc += f"total_items: {count}\n"
-        index_doc += "---\n\n"
-        index_doc += "# CyberRAG Knowledge Base Index\n\n"
-        index_doc += f"Total items exported: {count}\n\n"
-        index_doc += "## Sources\n\n"
+                to_write[export_dir / f"{safe_name}.md"] = "".join(doc)
+
+        index_doc = [
+            "---\n",
+            "title: \"CyberRAG Knowledge Base Index\"\n",
+            f"exported: {datetime.now(timezone.utc).isoformat()}\n",
+            f"total_items: {count}\n",
+            "---\n\n",
+            "# CyberRAG Knowledge Base Index\n\n",
+            f"Total items exported: {count}\n\n",
+            "## Sources\n\n",
+        ]
         for src, items in source_groups.items():
-            index_doc += f"### {src.replace('-', ' ').title()}\n\n"
-            cats = set(item["category"] for item in items)
+            index_doc.append(f"### {src.replace('-', ' ').title()}\n\n")
+            cats = set(item[4] for item in items)
             for cat in sorted(cats):
-                cat_count = sum(1 for item in items if item["category"] == cat)
-                index_doc += f"- **{cat}**: {cat_count} items\n"
-            index_doc += "\n"
+                cat_count = sum(1 for item in items if item[4] == cat)
+                index_doc.append(f"- **{cat}**: {cat_count} items\n")
+            index_doc.append("\n")
 
-        index_path = export_dir / "_index.md"
-        index_path.write_text(index_doc, encoding="utf-8")
+        to_write[export_dir / "_index.md"] = "".join(index_doc)
+        await write_files(to_write.items())
 
         return (f"✅ Exported {count} items to {export_dir}\n\n"
                 f"📁 **{len(source_groups)} source files** + 1 index file\n"
@@ -1321,7 +1959,6 @@ async def list_sources() -> str:
         conn = get_db()
         rows = conn.execute("SELECT * FROM sources ORDER BY last_ingested DESC").fetchall()
         total = conn.execute("SELECT COUNT(*) FROM knowledge").fetchone()[0]
-        conn.close()
 
         if not rows:
             return ("📭 No sources ingested yet. Try:\n"
@@ -1348,16 +1985,14 @@ async def refresh_source(source_name: str = "") -> str:
             return "❌ Provide a source name. Use list_sources to see available sources."
 
         conn = get_db()
-        deleted = conn.execute("DELETE FROM knowledge WHERE source=?", (source_name,)).rowcount
-        conn.commit()
-        conn.close()
+        with _db_write_lock, conn:
+            conn.execute("DELETE FROM knowledge_tags WHERE item_id IN (SELECT id FROM knowledge WHERE source=?)", (source_name,))
+            deleted = conn.execute("DELETE FROM knowledge WHERE source=?", (source_name,)).rowcount
 
         collection = get_collection()
         if collection:
             try:
-                existing = collection.get(where={"source": source_name})
-                if existing and existing["ids"]:
-                    collection.delete(ids=existing["ids"])
+                collection.delete(where={"source": source_name})
             except Exception:
                 pass
 
@@ -2,16 +2,26 @@
 """StudyCompanion MCP Server - Personal Cybersecurity Study Assistant"""
 import os
 import sys
+import asyncio
+import atexit
 import json
 import logging
 import hashlib
 import sqlite3
 import re
+import signal
+import itertools
+import threading
 from datetime import datetime, timezone
 from pathlib import Path
 
 from mcp.server.fastmcp import FastMCP
 
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
 # Configure logging to stderr
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +35,8 @@ DATA_DIR = Path(os.environ.get("STUDYCOMPANION_DATA_DIR", "/app/data"))
 SQLITE_PATH = DATA_DIR / "sqlite" / "studycompanion.db"
 CHROMADB_DIR = str(DATA_DIR / "chromadb")
 EXPORTS_DIR = DATA_DIR / "exports"
+EXPORT_WRITE_BUFFER = 1 << 20
+EXPORT_WRITE_CONCURRENCY = 32
 
 for d in [DATA_DIR / "sqlite", DATA_DIR / "chromadb", EXPORTS_DIR]:
     d.mkdir(parents=True, exist_ok=True)
@@ -53,13 +65,48 @@ for category, tags in TAXONOMY.items():
     ALL_TAGS.add(category)
     ALL_TAGS.update(tags)
 
+# Lookup tables derived from TAXONOMY once at import
+TAXONOMY_KEYS = frozenset(TAXONOMY)
+SORTED_TAXONOMY_KEYS = tuple(sorted(TAXONOMY))
+# (category, keyword) pairs in taxonomy order; a keyword listed under several categories appears once per category
+TAXONOMY_KEYWORDS = tuple((category, keyword) for category, keywords in TAXONOMY.items() for keyword in keywords)
+UNIQUE_KEYWORDS = tuple(dict.fromkeys(keyword for _, keyword in TAXONOMY_KEYWORDS))
+TAXONOMY_SAMPLE_TOPICS = {category: ", ".join(keywords[:5]) for category, keywords in TAXONOMY.items()}
+
+# One Aho-Corasick pass over a note when pyahocorasick is installed, otherwise a substring test per keyword
+if ahocorasick is not None:
+    TAXONOMY_AUTOMATON = ahocorasick.Automaton()
+    for keyword in UNIQUE_KEYWORDS:
+        TAXONOMY_AUTOMATON.add_word(keyword, keyword)
+    TAXONOMY_AUTOMATON.make_automaton()
+else:
+    TAXONOMY_AUTOMATON = None
+
+# Precompiled patterns for Q&A, flashcard and export generation
+# Runs of text between sentence terminators
+SENTENCE_RE = re.compile(r'[^.!?\n]+')
+BACKTICK_CMD_RE = re.compile(r'`([^`]+)`')
+DOLLAR_CMD_RE = re.compile(r'\$\s*(.+)')
+HOW_WHY_RE = re.compile(r'because|allows|enables|used to|can be|provides')
+
+# Characters not allowed in exported filenames, mapped to '_'
+UNSAFE_FILENAME_TABLE = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
+
 # === MCP SERVER ===
 mcp = FastMCP("StudyCompanion")
 
 # === SQLITE SETUP ===
-def get_db():
-    conn = sqlite3.connect(str(SQLITE_PATH))
-    conn.row_factory = sqlite3.Row
+SQLITE_PRAGMAS = (
+    "synchronous=NORMAL",
+    "temp_store=MEMORY",
+    # INSERT OR REPLACE only fires the notes delete trigger (keeping notes_fts in sync) with this on
+    "recursive_triggers=ON",
+)
+# One connection for the process, opened on first use; writes are serialized through _db_write_lock
+_db_conn = None
+_db_write_lock = threading.Lock()
+
+def init_schema(conn):
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("""CREATE TABLE IF NOT EXISTS notes (
         id TEXT PRIMARY KEY,
@@ -88,14 +135,75 @@ def get_db():
         tags TEXT DEFAULT '[]',
         created_at TEXT DEFAULT ''
     )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notes_category ON notes(category)")
+    try:
+        conn.execute("SELECT json_valid('[]')")
+    except sqlite3.OperationalError:
+        logger.warning("SQLite was built without JSON support; find_gaps will not work")
+    init_fts(conn)
     conn.commit()
-    return conn
+
+def init_fts(conn):
+    """Full-text index over note titles and content, kept in sync with notes by triggers."""
+    exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name='notes_fts'").fetchone()
+    # notes has a TEXT primary key, so the rowid this index keys on is implicit and VACUUM may renumber it;
+    # the index then needs a 'rebuild', which the integrity check below triggers on startup
+    try:
+        conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+            title, content, content='notes', content_rowid='rowid', tokenize='unicode61')""")
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 unavailable, keyword search disabled: {e}")
+        return
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+    END""")
+    conn.execute("""CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN
+        INSERT INTO notes_fts(notes_fts, rowid, title, content) VALUES ('delete', old.rowid, old.title, old.content);
+        INSERT INTO notes_fts(rowid, title, content) VALUES (new.rowid, new.title, new.content);
+    END""")
+    if not exists:
+        # Index notes written before the FTS table existed
+        conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+        return
+    try:
+        conn.execute("INSERT INTO notes_fts(notes_fts, rank) VALUES ('integrity-check', 1)")
+    except sqlite3.DatabaseError as e:
+        logger.warning(f"notes_fts out of sync with notes ({e}), rebuilding")
+        conn.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+def fts_query(text):
+    """Quote each word so user input is matched literally (all words must appear) rather than parsed as FTS5 syntax."""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+def get_db():
+    global _db_conn
+    if _db_conn is None:
+        conn = sqlite3.connect(str(SQLITE_PATH), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(f"PRAGMA {pragma}")
+        init_schema(conn)
+        _db_conn = conn
+    return _db_conn
+
+def close_db():
+    global _db_conn
+    if _db_conn is not None:
+        _db_conn.close()
+        _db_conn = None
+
+atexit.register(close_db)
 
 # === CHROMADB SETUP ===
 _collection = None
+# Cached collection.count(); reset to None whenever notes are upserted
+_collection_count = None
 
 def get_collection():
-    global _collection
+    global _collection, _collection_count
     if _collection is None:
         try:
             import chromadb
@@ -104,53 +212,99 @@ def get_collection():
                 name="studycompanion",
                 metadata={"hnsw:space": "cosine"}
             )
-            logger.info(f"ChromaDB collection ready: {_collection.count()} notes")
+            _collection_count = _collection.count()
+            logger.info(f"ChromaDB collection ready: {_collection_count} notes")
         except Exception as e:
             logger.error(f"ChromaDB init error: {e}")
             return None
     return _collection
 
+def collection_count():
+    """Number of notes in the ChromaDB collection, counted at most once between upserts."""
+    global _collection_count
+    if _collection_count is None:
+        collection = get_collection()
+        _collection_count = collection.count() if collection else 0
+    return _collection_count
+
 # === HELPER FUNCTIONS ===
-def content_hash(text):
-    return hashlib.sha256(text.encode()).hexdigest()[:16]
+def content_hash(data):
+    # Note, Q&A and flashcard ids are derived from this digest, so it must stay SHA-256:
+    # re-adding the same note or regenerating the same card replaces the row instead of duplicating it
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha256(data).hexdigest()[:16]
 
 def auto_tag(content):
     content_lower = content.lower()
-    detected_tags = []
-    detected_categories = []
-
-    for category, keywords in TAXONOMY.items():
-        for keyword in keywords:
-            if keyword in content_lower:
-                if category not in detected_categories:
-                    detected_categories.append(category)
-                if keyword not in detected_tags:
-                    detected_tags.append(keyword)
-
-    return detected_categories, detected_tags
+    # Dicts as ordered sets: constant-time dedup that keeps first-seen order
+    detected_tags = {}
+    detected_categories = {}
+
+    if TAXONOMY_AUTOMATON is not None:
+        found = {keyword for _, keyword in TAXONOMY_AUTOMATON.iter(content_lower)}
+    else:
+        found = {keyword for keyword in UNIQUE_KEYWORDS if keyword in content_lower}
+
+    # Report in taxonomy order so the first category stays the primary one
+    for category, keyword in TAXONOMY_KEYWORDS:
+        if keyword in found:
+            detected_categories.setdefault(category, None)
+            detected_tags.setdefault(keyword, None)
+
+    return list(detected_categories), list(detected_tags)
+
+def iter_sentences(text):
+    """Lazily yield the stripped sentences of text that are longer than 20 characters."""
+    for match in SENTENCE_RE.finditer(text):
+        sentence = match.group().strip()
+        if len(sentence) > 20:
+            yield sentence
+
+NOTE_BATCH_SIZE = 100
+INSERT_NOTE_SQL = """INSERT OR REPLACE INTO notes
+    (id, title, content, tags, category, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)"""
+# Embeddings waiting to be upserted into ChromaDB, keyed by id so re-adding a note before a flush keeps only its
+# latest version. Notes themselves are written to SQLite straight away; every tool that reads notes flushes first.
+_pending_notes = {}
 
 def store_note(note_id, title, content, tags, category):
     now = datetime.now(timezone.utc).isoformat()
     conn = get_db()
-    try:
-        conn.execute("""INSERT OR REPLACE INTO notes
-            (id, title, content, tags, category, created_at, updated_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)""",
-            (note_id, title, content, json.dumps(tags), category, now, now))
-        conn.commit()
-    finally:
-        conn.close()
+    with _db_write_lock, conn:
+        conn.execute(INSERT_NOTE_SQL, (note_id, title, content, json.dumps(tags), category, now, now))
+
+    _pending_notes[note_id] = (
+        content[:8000],
+        {"title": title, "category": category, "tags": json.dumps(tags[:10])}
+    )
+    if len(_pending_notes) >= NOTE_BATCH_SIZE:
+        flush_pending_notes()
+
+def flush_pending_notes():
+    """Upsert buffered notes into ChromaDB in one call. Returns the number flushed."""
+    global _collection_count
+    if not _pending_notes:
+        return 0
+    pending = list(_pending_notes.items())
+    _pending_notes.clear()
 
     collection = get_collection()
     if collection:
+        # Upserts may add or replace, so recount lazily rather than adjusting the cached count
+        _collection_count = None
         try:
             collection.upsert(
-                ids=[note_id],
-                documents=[content[:8000]],
-                metadatas=[{"title": title, "category": category, "tags": json.dumps(tags[:10])}]
+                ids=[note_id for note_id, _ in pending],
+                documents=[document for _, (document, _) in pending],
+                metadatas=[metadata for _, (_, metadata) in pending]
             )
         except Exception as e:
             logger.error(f"ChromaDB upsert error: {e}")
+    return len(pending)
+
+atexit.register(flush_pending_notes)
 
 # === NOTE MANAGEMENT TOOLS ===
 
@@ -181,22 +335,21 @@ async def add_note(title: str = "", content: str = "") -> str:
 async def tag_content(note_id: str = "", additional_tags: str = "") -> str:
     """Re-tag or manually add tags to an existing note. Provide comma-separated tags."""
     try:
+        flush_pending_notes()
         if not note_id:
             return "❌ Provide a note_id."
         conn = get_db()
         row = conn.execute("SELECT * FROM notes WHERE id=?", (note_id,)).fetchone()
         if not row:
-            conn.close()
             return f"❌ Note not found: {note_id}"
 
         existing_tags = json.loads(row["tags"]) if row["tags"] else []
         new_tags = [t.strip() for t in additional_tags.split(",") if t.strip()]
         combined = list(set(existing_tags + new_tags))
 
-        conn.execute("UPDATE notes SET tags=?, updated_at=? WHERE id=?",
-                     (json.dumps(combined), datetime.now(timezone.utc).isoformat(), note_id))
-        conn.commit()
-        conn.close()
+        with _db_write_lock, conn:
+            conn.execute("UPDATE notes SET tags=?, updated_at=? WHERE id=?",
+                         (json.dumps(combined), datetime.now(timezone.utc).isoformat(), note_id))
 
         return f"✅ Updated tags for {row['title']}\n🏷️ Tags: {', '.join(combined)}"
     except Exception as e:
@@ -204,17 +357,36 @@ async def tag_content(note_id: str = "", additional_tags: str = "") -> str:
 
 
 @mcp.tool()
-async def search_notes(query: str = "", top_k: str = "10") -> str:
-    """Semantic search across all personal study notes."""
+async def search_notes(query: str = "", top_k: str = "10", mode: str = "semantic") -> str:
+    """Search across all personal study notes. Modes: semantic (vector similarity) or fts (fast exact keyword match)."""
     try:
+        flush_pending_notes()
         if not query:
             return "❌ Please provide a search query."
         k = int(top_k)
+        if mode == "fts":
+            conn = get_db()
+            rows = conn.execute(
+                "SELECT n.title, n.category, n.content FROM notes_fts JOIN notes n ON n.rowid = notes_fts.rowid "
+                "WHERE notes_fts MATCH ? ORDER BY bm25(notes_fts) LIMIT ?", (fts_query(query), k)).fetchall()
+            if not rows:
+                return f"No notes found for: {query}"
+            output = f"🔍 Notes containing: '{query}'\n{'='*50}\n\n"
+            for i, row in enumerate(rows):
+                output += f"**{i+1}. {row['title']}**\n"
+                output += f"   Category: {row['category']}\n"
+                preview = row["content"][:200].replace("\n", " ")
+                output += f"   {preview}...\n\n"
+            return output
+        if mode != "semantic":
+            return f"❌ Unknown mode: {mode}. Use 'semantic' or 'fts'."
+
         collection = get_collection()
-        if not collection or collection.count() == 0:
+        count = collection_count()
+        if not collection or count == 0:
             return "❌ No notes yet. Use add_note to start building your knowledge base."
 
-        results = collection.query(query_texts=[query], n_results=min(k, collection.count()))
+        results = collection.query(query_texts=[query], n_results=min(k, count))
 
         if not results["documents"] or not results["documents"][0]:
             return f"No notes found for: {query}"
@@ -235,12 +407,23 @@ async def search_notes(query: str = "", top_k: str = "10") -> str:
         return f"❌ Error: {str(e)}"
 
 
+@mcp.tool()
+async def flush_notes() -> str:
+    """Index any buffered notes in the vector store immediately."""
+    try:
+        count = flush_pending_notes()
+        return f"✅ Flushed {count} buffered notes to the vector store."
+    except Exception as e:
+        return f"❌ Error: {str(e)}"
+
+
 # === STUDY MATERIAL GENERATION TOOLS ===
 
 @mcp.tool()
 async def generate_qa(note_id: str = "", num_questions: str = "5") -> str:
     """Generate Q&A pairs from a study note for training data and self-testing. Generates definition, how/why, and command-based questions."""
     try:
+        flush_pending_notes()
         if not note_id:
             return "❌ Provide a note_id. Use search_notes to find notes."
         n = int(num_questions)
@@ -248,16 +431,15 @@ async def generate_qa(note_id: str = "", num_questions: str = "5") -> str:
         conn = get_db()
         row = conn.execute("SELECT * FROM notes WHERE id=?", (note_id,)).fetchone()
         if not row:
-            conn.close()
             return f"❌ Note not found: {note_id}"
 
         title = row["title"]
         content = row["content"]
         tags = json.loads(row["tags"]) if row["tags"] else []
-        conn.close()
 
         qa_pairs = []
-        sentences = [s.strip() for s in re.split(r'[.!?\n]', content) if len(s.strip()) > 20]
+        # Only the first n sentences are ever used
+        sentences = list(itertools.islice(iter_sentences(content), max(n, 1)))
 
         # Definition questions
         qa_pairs.append({
@@ -267,7 +449,7 @@ async def generate_qa(note_id: str = "", num_questions: str = "5") -> str:
         })
 
         # Extract commands (backtick or $ prefix)
-        commands = re.findall(r'`([^`]+)`', content) + re.findall(r'\$\s*(.+)', content)
+        commands = BACKTICK_CMD_RE.findall(content) + DOLLAR_CMD_RE.findall(content)
         for cmd in commands[:n//2]:
             qa_pairs.append({
                 "question": f"What does the command '{cmd}' do in the context of {title}?",
@@ -277,7 +459,7 @@ async def generate_qa(note_id: str = "", num_questions: str = "5") -> str:
 
         # How/why questions from content
         for i, sent in enumerate(sentences[1:n]):
-            if any(kw in sent.lower() for kw in ["because", "allows", "enables", "used to", "can be", "provides"]):
+            if HOW_WHY_RE.search(sent.lower()):
                 qa_pairs.append({
                     "question": f"How does {title} relate to: {sent[:60]}...?",
                     "answer": sent,
@@ -294,14 +476,12 @@ async def generate_qa(note_id: str = "", num_questions: str = "5") -> str:
 
         # Store Q&A pairs
         now = datetime.now(timezone.utc).isoformat()
-        conn = get_db()
-        for qa in qa_pairs[:n]:
-            qa_id = f"qa-{content_hash(qa['question'])}"
-            conn.execute("""INSERT OR REPLACE INTO qa_pairs (id, note_id, question, answer, difficulty, tags, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (qa_id, note_id, qa["question"], qa["answer"], "medium", json.dumps(tags), now))
-        conn.commit()
-        conn.close()
+        with _db_write_lock, conn:
+            for qa in qa_pairs[:n]:
+                qa_id = f"qa-{content_hash(qa['question'])}"
+                conn.execute("""INSERT OR REPLACE INTO qa_pairs (id, note_id, question, answer, difficulty, tags, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                    (qa_id, note_id, qa["question"], qa["answer"], "medium", json.dumps(tags), now))
 
         output = f"📝 Generated {len(qa_pairs[:n])} Q&A pairs from: {title}\n{'='*50}\n\n"
         for i, qa in enumerate(qa_pairs[:n]):
@@ -316,47 +496,47 @@ async def generate_qa(note_id: str = "", num_questions: str = "5") -> str:
 async def create_flashcards(topic: str = "", deck_name: str = "general") -> str:
     """Create flashcard decks from notes matching a topic. Cards are stored for export to Anki or other tools."""
     try:
+        flush_pending_notes()
         if not topic:
             return "❌ Provide a topic to create flashcards from."
 
         collection = get_collection()
-        if not collection or collection.count() == 0:
+        count = collection_count()
+        if not collection or count == 0:
             return "❌ No notes available."
 
-        results = collection.query(query_texts=[topic], n_results=min(10, collection.count()))
+        results = collection.query(query_texts=[topic], n_results=min(10, count))
 
         if not results["documents"] or not results["documents"][0]:
             return f"No notes found for topic: {topic}"
 
-        conn = get_db()
         now = datetime.now(timezone.utc).isoformat()
         cards = []
+        card_rows = []
 
         for doc, meta in zip(results["documents"][0], results["metadatas"][0]):
             title = meta.get("title", "Unknown")
-            sentences = [s.strip() for s in re.split(r'[.!?\n]', doc) if len(s.strip()) > 20]
+            first_sentence = next(iter_sentences(doc), None)
 
-            if sentences:
-                card_id = f"fc-{content_hash(title + sentences[0])}"
+            if first_sentence:
+                card_id = f"fc-{content_hash(title + first_sentence)}"
                 front = f"What is {title}?"
-                back = sentences[0]
-                conn.execute("""INSERT OR REPLACE INTO flashcards (id, deck, front, back, tags, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (card_id, deck_name, front, back, meta.get("tags", "[]"), now))
+                back = first_sentence
+                card_rows.append((card_id, deck_name, front, back, meta.get("tags", "[]"), now))
                 cards.append({"front": front, "back": back})
 
-            commands = re.findall(r'`([^`]+)`', doc)
+            commands = BACKTICK_CMD_RE.findall(doc)
             for cmd in commands[:3]:
                 card_id = f"fc-{content_hash(cmd)}"
                 front = f"What does `{cmd}` do?"
                 back = f"Used in {title}: {cmd}"
-                conn.execute("""INSERT OR REPLACE INTO flashcards (id, deck, front, back, tags, created_at)
-                    VALUES (?, ?, ?, ?, ?, ?)""",
-                    (card_id, deck_name, front, back, meta.get("tags", "[]"), now))
+                card_rows.append((card_id, deck_name, front, back, meta.get("tags", "[]"), now))
                 cards.append({"front": front, "back": back})
 
-        conn.commit()
-        conn.close()
+        conn = get_db()
+        with _db_write_lock, conn:
+            conn.executemany("""INSERT OR REPLACE INTO flashcards (id, deck, front, back, tags, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)""", card_rows)
 
         output = f"🃏 Created {len(cards)} flashcards in deck: {deck_name}\n{'='*50}\n\n"
         for i, card in enumerate(cards[:10]):
@@ -372,14 +552,16 @@ async def create_flashcards(topic: str = "", deck_name: str = "general") -> str:
 async def summarize_topic(topic: str = "") -> str:
     """Summarize all knowledge on a specific topic by searching across all notes."""
     try:
+        flush_pending_notes()
         if not topic:
             return "❌ Provide a topic to summarize."
 
         collection = get_collection()
-        if not collection or collection.count() == 0:
+        count = collection_count()
+        if not collection or count == 0:
             return "❌ No notes available."
 
-        results = collection.query(query_texts=[topic], n_results=min(10, collection.count()))
+        results = collection.query(query_texts=[topic], n_results=min(10, count))
 
         if not results["documents"] or not results["documents"][0]:
             return f"No notes found for: {topic}"
@@ -409,35 +591,29 @@ async def summarize_topic(topic: str = "") -> str:
 async def track_progress() -> str:
     """Dashboard showing study coverage across all cybersecurity topics based on notes and taxonomy."""
     try:
+        flush_pending_notes()
         conn = get_db()
-        notes = conn.execute("SELECT tags, category FROM notes").fetchall()
+        category_counts = dict(conn.execute("SELECT category, COUNT(*) FROM notes GROUP BY category").fetchall())
         qa_count = conn.execute("SELECT COUNT(*) FROM qa_pairs").fetchone()[0]
         fc_count = conn.execute("SELECT COUNT(*) FROM flashcards").fetchone()[0]
-        conn.close()
 
-        covered_categories = set()
-        covered_tags = set()
-        for note in notes:
-            tags = json.loads(note["tags"]) if note["tags"] else []
-            covered_tags.update(tags)
-            if note["category"]:
-                covered_categories.add(note["category"])
+        note_count = sum(category_counts.values())
+        covered_categories = {category for category in category_counts if category}
 
         total_categories = len(TAXONOMY)
-        covered_cat_count = len(covered_categories.intersection(TAXONOMY.keys()))
+        covered_cat_count = len(covered_categories & TAXONOMY_KEYS)
         coverage_pct = round((covered_cat_count / total_categories) * 100, 1) if total_categories > 0 else 0
 
         output = f"📊 Study Progress Dashboard\n{'='*50}\n\n"
-        output += f"📝 Total notes: {len(notes)}\n"
+        output += f"📝 Total notes: {note_count}\n"
         output += f"❓ Q&A pairs: {qa_count}\n"
         output += f"🃏 Flashcards: {fc_count}\n"
         output += f"📈 Topic coverage: {covered_cat_count}/{total_categories} ({coverage_pct}%)\n\n"
         output += f"**Category Breakdown:**\n\n"
 
-        for category in sorted(TAXONOMY.keys()):
+        for category in SORTED_TAXONOMY_KEYS:
             if category in covered_categories:
-                count = sum(1 for n in notes if n["category"] == category)
-                output += f"  ✅ {category} ({count} notes)\n"
+                output += f"  ✅ {category} ({category_counts[category]} notes)\n"
             else:
                 output += f"  ⬜ {category}\n"
 
@@ -450,32 +626,24 @@ async def track_progress() -> str:
 async def find_gaps() -> str:
     """Identify weak areas and recommend next study topics based on coverage gaps in the taxonomy."""
     try:
+        flush_pending_notes()
         conn = get_db()
-        notes = conn.execute("SELECT tags, category FROM notes").fetchall()
-        conn.close()
-
-        covered_categories = set()
-        covered_tags = set()
-        category_counts = {}
-
-        for note in notes:
-            tags = json.loads(note["tags"]) if note["tags"] else []
-            covered_tags.update(tags)
-            cat = note["category"]
-            if cat:
-                covered_categories.add(cat)
-                category_counts[cat] = category_counts.get(cat, 0) + 1
+        category_counts = dict(conn.execute(
+            "SELECT category, COUNT(*) FROM notes WHERE category != '' GROUP BY category").fetchall())
+        # Tags are expanded by SQLite's JSON1 functions rather than decoded row by row in Python
+        covered_tags = {row[0] for row in conn.execute(
+            "SELECT DISTINCT j.value FROM notes, json_each(notes.tags) j WHERE json_valid(notes.tags)")}
+        covered_categories = set(category_counts)
 
         output = f"🔍 Knowledge Gap Analysis\n{'='*50}\n\n"
 
-        missing = [c for c in TAXONOMY.keys() if c not in covered_categories]
+        missing = [c for c in TAXONOMY if c not in covered_categories]
         weak = [(c, cnt) for c, cnt in category_counts.items() if cnt < 3]
 
         if missing:
             output += f"**🚫 Missing Categories ({len(missing)}):**\n"
             for cat in missing:
-                sample_topics = ", ".join(TAXONOMY[cat][:5])
-                output += f"  • {cat} — try: {sample_topics}\n"
+                output += f"  • {cat} — try: {TAXONOMY_SAMPLE_TOPICS[cat]}\n"
             output += "\n"
 
         if weak:
@@ -500,23 +668,32 @@ async def find_gaps() -> str:
 
 # === EXPORT TOOLS ===
 
+async def write_files(files):
+    """Write (path, text) pairs as UTF-8 from worker threads, EXPORT_WRITE_CONCURRENCY at a time."""
+    semaphore = asyncio.Semaphore(EXPORT_WRITE_CONCURRENCY)
+
+    async def write_one(path, text):
+        async with semaphore:
+            await asyncio.to_thread(path.write_text, text, encoding="utf-8")
+
+    await asyncio.gather(*(write_one(path, text) for path, text in files))
+
 @mcp.tool()
 async def export_study_data(format_type: str = "jsonl") -> str:
     """Export all study data (notes, Q&A pairs, flashcards) as JSONL for RAG training or Obsidian markdown."""
     try:
+        flush_pending_notes()
+        # Rows are streamed from the cursors rather than loaded up front
         conn = get_db()
-        notes = conn.execute("SELECT * FROM notes").fetchall()
-        qa_pairs = conn.execute("SELECT * FROM qa_pairs").fetchall()
-        flashcards = conn.execute("SELECT * FROM flashcards").fetchall()
-        conn.close()
 
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         count = 0
 
         if format_type == "jsonl":
             export_path = EXPORTS_DIR / f"studycompanion_{timestamp}.jsonl"
-            with open(export_path, "w") as f:
-                for note in notes:
+            note_count = qa_count = 0
+            with open(export_path, "wb", buffering=EXPORT_WRITE_BUFFER) as f:
+                for note in conn.execute("SELECT title, content, tags, category FROM notes"):
                     entry = {
                         "type": "note",
                         "title": note["title"],
@@ -524,26 +701,31 @@ async def export_study_data(format_type: str = "jsonl") -> str:
                         "tags": json.loads(note["tags"]) if note["tags"] else [],
                         "category": note["category"]
                     }
-                    f.write(json.dumps(entry) + "\n")
-                    count += 1
-                for qa in qa_pairs:
+                    f.write(json.dumps(entry, separators=(",", ":")).encode())
+                    f.write(b"\n")
+                    note_count += 1
+                for qa in conn.execute("SELECT question, answer, difficulty FROM qa_pairs"):
                     entry = {
                         "type": "qa",
                         "question": qa["question"],
                         "answer": qa["answer"],
                         "difficulty": qa["difficulty"]
                     }
-                    f.write(json.dumps(entry) + "\n")
-                    count += 1
+                    f.write(json.dumps(entry, separators=(",", ":")).encode())
+                    f.write(b"\n")
+                    qa_count += 1
+            count = note_count + qa_count
+            fc_count = conn.execute("SELECT COUNT(*) FROM flashcards").fetchone()[0]
 
-            return f"✅ Exported {count} items to {export_path}\n📊 Format: JSONL (RAG-ready)\n  Notes: {len(notes)} | Q&A: {len(qa_pairs)} | Flashcards: {len(flashcards)}"
+            return f"✅ Exported {count} items to {export_path}\n📊 Format: JSONL (RAG-ready)\n  Notes: {note_count} | Q&A: {qa_count} | Flashcards: {fc_count}"
 
         elif format_type == "obsidian":
             export_dir = EXPORTS_DIR / f"obsidian_{timestamp}"
             export_dir.mkdir(exist_ok=True)
-            for note in notes:
+            to_write = {}
+            for note in conn.execute("SELECT title, content, tags, category, created_at FROM notes"):
                 tags = json.loads(note["tags"]) if note["tags"] else []
-                safe_title = re.sub(r'[<>:"/\\|?*]', '_', note["title"])[:100]
+                safe_title = note["title"].translate(UNSAFE_FILENAME_TABLE)[:100]
 
                 frontmatter = "---\n"
                 frontmatter += f"title: \"{note['title']}\"\n"
@@ -552,10 +734,11 @@ async def export_study_data(format_type: str = "jsonl") -> str:
                 frontmatter += f"created: {note['created_at']}\n"
                 frontmatter += "---\n\n"
 
-                filepath = export_dir / f"{safe_title}.md"
-                filepath.write_text(frontmatter + note["content"], encoding="utf-8")
+                to_write[export_dir / f"{safe_title}.md"] = frontmatter + note["content"]
                 count += 1
 
+            await write_files(to_write.items())
+
             return f"✅ Exported {count} notes to {export_dir}\n📁 Copy to your Obsidian vault."
         else:
             return f"❌ Unknown format: {format_type}. Use 'jsonl' or 'obsidian'."
@@ -564,9 +747,16 @@ async def export_study_data(format_type: str = "jsonl") -> str:
 
 
 # === SERVER STARTUP ===
+def handle_sigterm(signum, frame):
+    """docker stop sends SIGTERM, which skips atexit; index buffered notes and close the database first."""
+    flush_pending_notes()
+    close_db()
+    os._exit(0)
+
 if __name__ == "__main__":
     logger.info("Starting StudyCompanion MCP server...")
     logger.info(f"Data directory: {DATA_DIR}")
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
     try:
         mcp.run(transport='stdio')